@@ -1,4 +1,11 @@
+import dot
+import profiling
+from dfa_table import DEAD, TableDFA, from_dfa, hopcroft
+from nfa_table import NFATable, determinize, nfa_counts
+
 class State:
+    __slots__ = ('transitions',)
+
     def __init__(self):
         self.transitions = {}
 
@@ -6,6 +13,7 @@ class NFA:
     def __init__(self, start_state, end_state):
         self.start_state = start_state
         self.end_state = end_state
+        self._table = None
 
     def epsilon_closure(self, state):
         closure = set()
@@ -18,26 +26,16 @@ class NFA:
                     stack.append(next_state)
         return closure
 
+    def compile(self):
+        if self._table is None:
+            self._table = NFATable(self)
+        return self._table
+
     def symbols(self):
-        symbols = set()
-        for state in self.states():
-            for symbol in state.transitions.keys():
-                if symbol != '':
-                    symbols.add(symbol)
-        return symbols
-    
+        return set(self.compile().symbols)
+
     def states(self):
-        visited = set()
-        queue = [self.start_state]
-        while queue:
-            state = queue.pop(0)
-            if state in visited:
-                continue
-            visited.add(state)
-            for symbol, transitions in state.transitions.items():
-                for next_state in transitions:
-                    queue.append(next_state)
-        return visited
+        return set(self.compile().states)
 
     def move(self, states, symbol):
         next_states = set()
@@ -46,6 +44,7 @@ class NFA:
             next_states.update(transitions)
         return next_states
 
+@profiling.stage('postfix_to_nfa', nfa_counts('nfa'))
 def postfix_to_nfa(postfix_expr):
     stack = []
 
@@ -57,6 +56,13 @@ def postfix_to_nfa(postfix_expr):
             start.transitions[''] = [nfa.start_state, end]
             nfa.end_state.transitions[''] = [nfa.start_state, end]
             stack.append(NFA(start, end))
+        elif c == '?':
+            nfa = stack.pop()
+            start = State()
+            end = State()
+            start.transitions[''] = [nfa.start_state, end]
+            nfa.end_state.transitions[''] = [end]
+            stack.append(NFA(start, end))
         elif c == '+':
             nfa2 = stack.pop()
             nfa1 = stack.pop()
@@ -129,51 +135,45 @@ class DFA:
         self.states = set()
         self.transitions = {}
         self.states.add(start_state)
+        self._table = None
 
     def add_state(self, state):
         self.states.add(state)
+        self._table = None
+
+    def compile(self):
+        if self._table is None:
+            self._table = from_dfa(self)
+        return self._table
 
     def symbols(self):
-        symbols = set()
-        for state in self.states:
-            for symbol in state.transitions.keys():
-                if symbol != '':
-                    symbols.add(symbol)
-        return symbols
+        return set(self.compile().alphabet)
 
 
 
+@profiling.stage('nfa_to_dfa')
 def nfa_to_dfa(nfa):
-    start_state = DFAState(nfa.epsilon_closure(nfa.start_state))
-    dfa_states = [start_state]
-    queue = [start_state]
-    sigma = nfa.symbols()
-
-    # DFA 
-    dfa = DFA(start_state, [])
+    nfa_table = nfa.compile()
+    table, sets = determinize(nfa_table)
+    dfa = dfa_from_table(table, [nfa_table.to_states(mask) for mask in sets])
+    dfa.stats = {'states': table.num_states - 1, 'transitions': table.num_transitions}
+    return dfa
 
-    while queue:
-        dfa_state = queue.pop(0)
+def dfa_from_table(table, nfa_states):
+    dfa_states = [None] + [DFAState(nfa_states[state_id]) for state_id in range(1, table.num_states)]
+    dfa = DFA(dfa_states[table.start] or DFAState(set()), [])
+    for state_id in range(1, table.num_states):
+        dfa_state = dfa_states[state_id]
         dfa.add_state(dfa_state)
-
-        for symbol in sigma:
-            next_nfa_states = nfa.move(dfa_state.nfa_states, symbol)
-            if not next_nfa_states:
-                continue
-            next_dfa_state = None
-
-            for state in dfa_states:
-                if next_nfa_states == state.nfa_states:
-                    next_dfa_state = state
-                    break
-
-            if not next_dfa_state:
-                next_dfa_state = DFAState(next_nfa_states)
-                dfa_states.append(next_dfa_state)
-                queue.append(next_dfa_state)
-
-            dfa_state.transitions[symbol] = next_dfa_state
-
+        if table.accept[state_id]:
+            dfa.accept_states.append(dfa_state)
+        row = state_id * table.width
+        for column, symbol in enumerate(table.alphabet):
+            target = table.table[row + column]
+            if target != DEAD:
+                dfa_state.transitions[symbol] = dfa_states[target]
+
+    dfa._table = table
     return dfa
 
 def print_dfa(dfa):
@@ -203,106 +203,32 @@ def print_dfa(dfa):
             print(id(state), '->', id(next_state), symbol)
     print()
 
-from graphviz import Digraph
-
-def graph(dfa):
-    dot = Digraph()
-    dot.attr(rankdir='LR')
-    dot.node(str(id(dfa.start_state)), shape='point')
-    for state in dfa.accept_states:
-        dot.node(str(id(state)), peripheries='2')
-    for state in dfa.states:
-        dot.node(str(id(state)))
-        if state == dfa.start_state:
-            dot.edge(str(id(dfa.start_state)), str(id(state)), label='')
-        for symbol, next_state in state.transitions.items():
-            dot.edge(str(id(state)), str(id(next_state)), label=symbol)
-    dot.render('dfa.gv', view=True)
+def graph(dfa, filename='dfa.gv', view=True):
+    return dot.render(dfa, filename, format='pdf', view=view, name='dfa')
 
+@profiling.stage('minimize_dfa')
 def minimize_dfa(dfa):
-    accepting_states = set()
-    non_accepting_states = set()
-    for state in dfa.states:
-        if state in dfa.accept_states:
-            accepting_states.add(state)
-        else:
-            non_accepting_states.add(state)
-
-    partitions = [accepting_states, non_accepting_states]
-    queue = [accepting_states, non_accepting_states]
-
-    while queue:
-        p = queue.pop(0)
-        for symbol in dfa.symbols():
-            x = set()
-            for state in p:
-                x.add(state.transitions.get(symbol, None))
-
-            new_partitions = []
-            for partition in partitions:
-                y = partition.intersection(x)
-                z = partition.difference(x)
-                if y and z:
-                    new_partitions.append(y)
-                    new_partitions.append(z)
-                else:
-                    new_partitions.append(partition)
-
-            if len(new_partitions) > len(partitions):
-                partitions = new_partitions
-                queue.append(y)
-                queue.append(z)
-
-    dfa_states = []
-    dfa_transitions = {}
-
-    for partition in partitions:
-        dfa_state = DFAState(set())
-        for state in partition:
-            dfa_state.nfa_states.update(state.nfa_states)
-
-        dfa_states.append(dfa_state)
-
-    for dfa_state in dfa_states:
-        for symbol in dfa.symbols():
-            next_states = set()
-            for state in dfa_state.nfa_states:
-                next_states.update(state.transitions.get(symbol, set()))
-            for partition in partitions:
-                if next_states.issubset(partition):
-                    next_dfa_state = None
-                    for state in dfa_states:
-                        if state.nfa_states == next_states:
-                            next_dfa_state = state
-                            break
-                    if not next_dfa_state:
-                        next_dfa_state = DFAState(next_states)
-                        dfa_states.append(next_dfa_state)
-                    dfa_state.transitions[symbol] = next_dfa_state
-
-    new_dfa = DFA(dfa_states[0], set())
-    for dfa_state in dfa_states:
-        if dfa_state.nfa_states.intersection(dfa.accept_states):
-            new_dfa.accept_states.add(dfa_state)
-        new_dfa.add_state(dfa_state)
+    table = dfa.compile()
+    ids = {dfa.start_state: table.start}
+    order = [dfa.start_state]
+    for state in order:
+        for symbol, next_state in state.transitions.items():
+            if next_state not in ids:
+                ids[next_state] = table.next_state(ids[state], symbol)
+                order.append(next_state)
 
-    return new_dfa
+    minimal, mapping = hopcroft(table)
+    nfa_states = [set() for _ in range(minimal.num_states)]
+    for state, state_id in ids.items():
+        nfa_states[mapping[state_id]].update(state.nfa_states)
+    return dfa_from_table(minimal, nfa_states)
 
 
 def nfa_accepts_string(nfa, string):
-    current_states = nfa.epsilon_closure(nfa.start_state)
-    for symbol in string:
-        next_states = nfa.move(current_states, symbol)
-        current_states = set()
-        for state in next_states:
-            current_states.update(nfa.epsilon_closure(state))
-    return any(state == nfa.end_state for state in current_states)
+    return nfa.compile().bit_parallel().accepts(string)
 
 def dfa_accepts_string(dfa, string):
-    current_state = dfa.start_state
-    for symbol in string:
-        if symbol not in current_state.transitions:
-            return False
-        current_state = current_state.transitions[symbol]
-    return current_state in dfa.accept_states
+    if not isinstance(dfa, TableDFA):
+        dfa = dfa.compile()
+    return dfa.accepts(string)
 
@@ -1,4 +1,9 @@
-from graphviz import Digraph
+from array import array
+from collections import deque
+
+import dot
+from dfa_table import DEAD, TableDFA, minimize
+from nfa_table import bits
 
 class Estado:
     def __init__(self, nombre, aceptacion=False):
@@ -19,9 +24,12 @@ class Automata:
         self.estado_inicial = estado_inicial
         self.estado_aceptacion = estado_aceptacion
         self.transiciones_dict = {}
+        self.tabla = None
 
         
     def acepta(self, cadena):
+        if self.tabla is not None:
+            return self.tabla.accepts(cadena)
         estado_actual = self.estado_inicial
         for simbolo in cadena:
             if simbolo not in estado_actual.transiciones:
@@ -48,119 +56,136 @@ class Automata:
                     self.transiciones_dict[(estado, simbolo)] = destino
         return self.transiciones_dict
     
-    def to_dot(self):
-        dot = Digraph()
-        dot.attr('node', shape='circle')
-        for estado in self.estados():
-            attrs = {'shape': 'doublecircle'} if estado.aceptacion else {}
-            dot.node(str(estado), **attrs)
-        dot.node('inicial', shape='point')
-        dot.edge('inicial', str(self.estado_inicial))
-        for origen, simbolo in self.transiciones_dict.keys():
-            dot.edge(str(origen), str(self.transiciones_dict[(origen, simbolo)]), label=simbolo)
-        
-        dot.format = 'png'
-        dot.render('automata')
+    def to_dot(self, renderizar=True):
+        tabla = self.tabla if self.tabla is not None else a_tabla(self)
+        if renderizar:
+            dot.render(tabla, 'automata', format='png', name='automata')
+        return dot.to_dot(tabla, name='automata')
 
-        return dot.source
+def construir_tabla(expresion_regular):
+    """Construccion directa del AFD a partir de la expresion en postfix.
 
-def construir_afd(expresion_regular):
+    Cada simbolo es una posicion; anulable, primeros, ultimos y siguientes
+    (followpos) se calculan como mascaras de bits al recorrer la postfix, que
+    ya visita el arbol sintactico de las hojas a la raiz. Los estados del AFD
+    son conjuntos de posiciones y no se construye ningun AFN.
+    """
+    simbolos = []
+    siguientes = []
     pila = []
     for simbolo in expresion_regular:
         if simbolo == '|':
-            derecha = pila.pop()
-            izquierda = pila.pop()
-            nuevo_inicial = Estado('q')
-            nuevo_inicial.agregar_transicion('e', izquierda.estado_inicial)
-            nuevo_inicial.agregar_transicion('e', derecha.estado_inicial)
-            nuevo_aceptacion = Estado('q', True)
-            izquierda.estado_aceptacion.agregar_transicion('e', nuevo_aceptacion)
-            derecha.estado_aceptacion.agregar_transicion('e', nuevo_aceptacion)
-            pila.append(Automata(nuevo_inicial, nuevo_aceptacion))
+            anulable2, primeros2, ultimos2 = pila.pop()
+            anulable1, primeros1, ultimos1 = pila.pop()
+            pila.append((anulable1 or anulable2, primeros1 | primeros2, ultimos1 | ultimos2))
         elif simbolo == '.':
-            derecha = pila.pop()
-            izquierda = pila.pop()
-            izquierda.estado_aceptacion.agregar_transicion('e', derecha.estado_inicial)
-            pila.append(Automata(izquierda.estado_inicial, derecha.estado_aceptacion))
+            pila.append(_concatenar(pila.pop(-2), pila.pop(), siguientes))
         elif simbolo == '*':
-            automata = pila.pop()
-            nuevo_inicial = Estado('q')
-            nuevo_aceptacion = Estado('q', True)
-            nuevo_inicial.agregar_transicion('e', automata.estado_inicial)
-            automata.estado_aceptacion.agregar_transicion('e', nuevo_aceptacion)
-            nuevo_inicial.agregar_transicion('e', nuevo_aceptacion)
-            automata.estado_aceptacion.agregar_transicion('e', automata.estado_inicial)
-            pila.append(Automata(nuevo_inicial, nuevo_aceptacion))
+            anulable, primeros, ultimos = pila.pop()
+            for posicion in bits(ultimos):
+                siguientes[posicion] |= primeros
+            pila.append((True, primeros, ultimos))
+        elif simbolo == '?':
+            anulable, primeros, ultimos = pila.pop()
+            pila.append((True, primeros, ultimos))
         else:
-            nuevo_estado = Estado('q')
-            nuevo_aceptacion = Estado('q', True)
-            nuevo_estado.agregar_transicion(simbolo, nuevo_aceptacion)
-            pila.append(Automata(nuevo_estado, nuevo_aceptacion))
+            posicion = len(simbolos)
+            simbolos.append(simbolo)
+            siguientes.append(0)
+            pila.append((False, 1 << posicion, 1 << posicion))
+
+    # posicion final '#' concatenada a la expresion aumentada
+    fin = len(simbolos)
+    simbolos.append(None)
+    siguientes.append(0)
+    raiz = (False, 1 << fin, 1 << fin)
+    if pila:
+        raiz = _concatenar(pila.pop(), raiz, siguientes)
+
+    alfabeto = sorted({simbolo for simbolo in simbolos if simbolo is not None})
+    columnas = {simbolo: i for i, simbolo in enumerate(alfabeto)}
+    ancho = len(alfabeto)
+    inicial = raiz[1]
+    indice = {inicial: 1}
+    por_revisar = deque([inicial])
+    tabla = array('i', [DEAD]) * ancho
+    aceptacion = bytearray([0])
+    while por_revisar:
+        conjunto = por_revisar.popleft()
+        aceptacion.append(conjunto >> fin & 1)
+        destinos = [0] * ancho
+        for posicion in bits(conjunto):
+            if posicion != fin:
+                destinos[columnas[simbolos[posicion]]] |= siguientes[posicion]
+        fila = array('i', [DEAD]) * ancho
+        for columna, destino in enumerate(destinos):
+            if not destino:
+                continue
+            estado = indice.get(destino)
+            if estado is None:
+                estado = indice[destino] = len(indice) + 1
+                por_revisar.append(destino)
+            fila[columna] = estado
+        tabla.extend(fila)
 
-    dfa = pila.pop()
-    print(dfa.to_dot())  # Display the DFA graph
+    return TableDFA(alfabeto, tabla, aceptacion, 1)
+
+
+def _concatenar(izquierda, derecha, siguientes):
+    anulable1, primeros1, ultimos1 = izquierda
+    anulable2, primeros2, ultimos2 = derecha
+    for posicion in bits(ultimos1):
+        siguientes[posicion] |= primeros2
+    primeros = primeros1 | primeros2 if anulable1 else primeros1
+    ultimos = ultimos1 | ultimos2 if anulable2 else ultimos2
+    return (anulable1 and anulable2, primeros, ultimos)
+
+
+def construir_afd(expresion_regular):
+    dfa = desde_tabla(construir_tabla(expresion_regular))
+    print(dfa.to_dot(renderizar=False))  # Display the DFA graph
     return dfa
 
 
-def minimizar_dfa(dfa):
-    # Create the initial partition, which consists of two groups: the accepting states, and the non-accepting states
-    aceptacion = [estado for estado in dfa.estados() if estado.aceptacion]
-    no_aceptacion = [estado for estado in dfa.estados() if not estado.aceptacion]
-    particion_actual = [aceptacion, no_aceptacion]
-    
-    # Keep track of which partition each state belongs to
-    estados_a_particiones = {}
-    for i, particion in enumerate(particion_actual):
-        for estado in particion:
-            estados_a_particiones[estado] = i
-    
-    # Keep refining the partition until it no longer changes
-    while True:
-        nuevas_particiones = []
-        for particion in particion_actual:
-            nuevas_subparticiones = {}
-            for estado in particion:
-                transiciones = estado.transiciones
-                subparticion_key = tuple(estados_a_particiones[transicion] for simbolo, transiciones in transiciones.items() for transicion in transiciones)
-                if subparticion_key not in nuevas_subparticiones:
-                    nuevas_subparticiones[subparticion_key] = []
-                nuevas_subparticiones[subparticion_key].append(estado)
-            nuevas_particiones.extend(nuevas_subparticiones.values())
-        
-        if nuevas_particiones == particion_actual:
-            break
-        
-        particion_actual = nuevas_particiones
-        for i, particion in enumerate(particion_actual):
-            for estado in particion:
-                estados_a_particiones[estado] = i
-    
-    # Create a new set of states for the minimized DFA
-    nuevo_estados = []
-    nuevo_a_particiones = {}
-    for i, particion in enumerate(particion_actual):
-        nuevo_estado = Estado(str(i), any(estado.aceptacion for estado in particion))
-        nuevo_estados.append(nuevo_estado)
-        for estado in particion:
-            nuevo_a_particiones[estado] = nuevo_estado
-    
-    # Add transitions to the new states
-    for estado in dfa.estados():
+def a_tabla(automata):
+    estados = automata.estados()
+    ids = {estado: i + 1 for i, estado in enumerate(estados)}
+    alfabeto = sorted({simbolo for estado in estados for simbolo in estado.transiciones})
+    columnas = {simbolo: i for i, simbolo in enumerate(alfabeto)}
+    ancho = len(alfabeto)
+    tabla = array('i', [DEAD]) * ((len(estados) + 1) * ancho)
+    aceptacion = bytearray(len(estados) + 1)
+    for estado in estados:
+        fila = ids[estado] * ancho
         for simbolo, destinos in estado.transiciones.items():
-            nuevo_origen = nuevo_a_particiones[estado]
-            nuevo_destino = nuevo_a_particiones[destinos[0]]
-            nuevo_origen.agregar_transicion(simbolo, nuevo_destino)
-    
-    # Find the new initial and accepting states
-    nuevo_estado_inicial = nuevo_a_particiones[dfa.estado_inicial]
+            tabla[fila + columnas[simbolo]] = ids[destinos[0]]
+        aceptacion[ids[estado]] = estado.aceptacion
+    return TableDFA(alfabeto, tabla, aceptacion, ids[automata.estado_inicial])
+
+
+def desde_tabla(tabla):
+    nuevo_estados = [Estado(str(i), bool(tabla.accept[i])) for i in range(tabla.num_states)]
+    for i in range(1, tabla.num_states):
+        fila = i * tabla.width
+        for columna, simbolo in enumerate(tabla.alphabet):
+            destino = tabla.table[fila + columna]
+            if destino != DEAD:
+                nuevo_estados[i].agregar_transicion(simbolo, nuevo_estados[destino])
+
     nuevo_estado_aceptacion = None
     for estado in nuevo_estados:
         if estado.aceptacion:
             nuevo_estado_aceptacion = estado
             break
-    
-    # Create and return the minimized DFA
-    return Automata(nuevo_estado_inicial, nuevo_estado_aceptacion)
+    automata = Automata(nuevo_estados[tabla.start], nuevo_estado_aceptacion)
+    automata.tabla = tabla
+    return automata
+
+
+def minimizar_dfa(dfa):
+    # Hopcroft sobre la tabla; el estado muerto 0 queda fuera del automata
+    tabla = dfa.tabla if dfa.tabla is not None else a_tabla(dfa)
+    return desde_tabla(minimize(tabla))
 
 
 #dfa = construir_afd('(a|b)*')
@@ -0,0 +1,184 @@
+"""Benchmarks for the regex pipeline over families of hard expressions.
+
+    python bench.py --output results.json
+    python bench.py --output new.json --compare results.json
+
+Every stage from infix_a_postfix to the matchers is timed (best of
+``--repeat``) and measured once more under tracemalloc for peak memory.
+The generated-code matcher from codegen is timed next to the table DFA.
+With ``--compare`` each stage is checked against a previous run and the
+script exits with status 1 if any got slower than ``--threshold`` times.
+"""
+import argparse
+import json
+import platform
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+import codegen
+from AFD import dfa_accepts_string, minimize_dfa, nfa_accepts_string, nfa_to_dfa, postfix_to_nfa
+from postfix import infix_a_postfix
+
+
+def nested_stars(n):
+    return '(' * n + 'a' + ')*' * n, 'a'
+
+
+def blowup(n):
+    return '(a|b)*.a' + '.(a|b)' * n, 'ab'
+
+
+def long_literal(n):
+    rng = random.Random(n)
+    return '.'.join(rng.choice('abcd') for _ in range(n)), 'abcd'
+
+
+def wide_alternation(n):
+    rng = random.Random(n)
+    letters = string.ascii_lowercase
+    words = {'.'.join(rng.choice(letters) for _ in range(3)) for _ in range(n)}
+    return '|'.join(sorted(words)), letters
+
+
+FAMILIES = {
+    'nested_stars': (nested_stars, [2, 8, 32]),
+    'blowup': (blowup, [4, 8, 12]),
+    'long_literal': (long_literal, [16, 128, 1024]),
+    'wide_alternation': (wide_alternation, [8, 64, 256]),
+}
+QUICK = {
+    'nested_stars': [2, 8],
+    'blowup': [4, 6],
+    'long_literal': [16, 128],
+    'wide_alternation': [8, 32],
+}
+INPUT_SIZES = [100, 10000, 100000]
+
+
+def measure(fn, setup=None, repeat=3):
+    """Return (result, best seconds, peak bytes) for ``fn(setup())``."""
+    best = None
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        result = fn(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    arg = setup() if setup else None
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def bench_expression(family, n, expression, alphabet, input_sizes, repeat):
+    rows = []
+
+    def record(stage, seconds, peak, **extra):
+        rows.append(dict(family=family, n=n, stage=stage, seconds=seconds, peak_bytes=peak, **extra))
+
+    postfix, seconds, peak = measure(lambda _: infix_a_postfix(expression), repeat=repeat)
+    record('infix_a_postfix', seconds, peak)
+    nfa, seconds, peak = measure(lambda _: postfix_to_nfa(postfix), repeat=repeat)
+    record('postfix_to_nfa', seconds, peak, states=len(nfa.compile()))
+    dfa, seconds, peak = measure(nfa_to_dfa, lambda: postfix_to_nfa(postfix), repeat=repeat)
+    record('nfa_to_dfa', seconds, peak, states=dfa.stats['states'], transitions=dfa.stats['transitions'])
+    minimal, seconds, peak = measure(lambda _: minimize_dfa(dfa), repeat=repeat)
+    record('minimize_dfa', seconds, peak, states=minimal.compile().num_states - 1)
+    generated = None
+    if minimal.compile().num_states <= codegen.MAX_STATES:
+        generated, seconds, peak = measure(lambda _: codegen.GeneratedDFA(minimal.compile()), repeat=repeat)
+        record('codegen', seconds, peak)
+
+    rng = random.Random(n)
+    nfa_accepts_string(nfa, '')
+    dfa_accepts_string(minimal, '')
+    for size in input_sizes:
+        text = ''.join(rng.choice(alphabet) for _ in range(size))
+        _, seconds, peak = measure(lambda _: nfa_accepts_string(nfa, text), repeat=repeat)
+        record('nfa_accepts_string', seconds, peak, input_size=size)
+        _, seconds, peak = measure(lambda _: dfa_accepts_string(minimal, text), repeat=repeat)
+        record('dfa_accepts_string', seconds, peak, input_size=size)
+        if generated is not None:
+            _, seconds, peak = measure(lambda _: generated.accepts(text), repeat=repeat)
+            record('codegen_accepts', seconds, peak, input_size=size)
+    return rows
+
+
+def run(quick=False, repeat=3):
+    rows = []
+    for family, (build, params) in FAMILIES.items():
+        for n in (QUICK[family] if quick else params):
+            expression, alphabet = build(n)
+            input_sizes = INPUT_SIZES[:1] if family != 'blowup' else INPUT_SIZES
+            rows.extend(bench_expression(family, n, expression, alphabet, input_sizes, repeat))
+    # growing inputs against one fixed pattern
+    expression, alphabet = blowup(3)
+    rows.extend(bench_expression('input_growth', 3, expression, alphabet,
+                                 INPUT_SIZES[:2] if quick else INPUT_SIZES + [1000000], repeat))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': rows,
+    }
+
+
+def _key(row):
+    return (row['family'], row['n'], row['stage'], row.get('input_size'))
+
+
+def compare(old, new, threshold, min_seconds=0.001):
+    """Return the rows of ``new`` that are more than ``threshold`` times slower.
+
+    Stages faster than ``min_seconds`` in both runs are ignored as noise.
+    """
+    baseline = {_key(row): row for row in old['results']}
+    regressions = []
+    for row in new['results']:
+        before = baseline.get(_key(row))
+        if not before or max(before['seconds'], row['seconds']) < min_seconds:
+            continue
+        if before['seconds'] > 0 and row['seconds'] / before['seconds'] > threshold:
+            regressions.append((row, row['seconds'] / before['seconds']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='previous results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--min-seconds', type=float, default=0.001,
+                        help='ignore stages faster than this when comparing')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='smaller parameters')
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.repeat)
+    for row in results['results']:
+        size = f" input={row['input_size']}" if 'input_size' in row else ''
+        print(f"{row['family']:<17} n={row['n']:<5} {row['stage']:<19}{size:<15} "
+              f"{row['seconds'] * 1000:10.3f} ms {row['peak_bytes'] / 1024:10.1f} KiB")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold, args.min_seconds)
+        for row, ratio in regressions:
+            print(f"REGRESSION {row['family']} n={row['n']} {row['stage']}: {ratio:.2f}x slower")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
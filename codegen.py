@@ -0,0 +1,240 @@
+"""Compile a TableDFA into specialized Python functions.
+
+Every state becomes a block of character tests inside one ``for`` loop
+over the input, so no table index is computed per character. The state
+to run is picked by a binary tree of integer comparisons, and a literal
+run at the start of the expression is checked with one ``str.startswith``.
+"""
+import hashlib
+import os
+import tempfile
+
+import serialize
+from dfa_table import DEAD, TableDFA
+from nfa_table import merge_ranges
+
+# bump when the generated code changes, so cached sources are regenerated
+VERSION = 1
+# larger DFAs make sources that take longer to compile than they save
+MAX_STATES = 2000
+# states per if/elif chain before the dispatch is split in two
+CHAIN = 4
+
+
+def _edges(dfa, state, column_ranges):
+    # target -> sorted, merged (first, last) code point ranges leading to it
+    edges = {}
+    row = state * dfa.width
+    for column, label in enumerate(dfa.alphabet):
+        target = dfa.table[row + column]
+        if target == DEAD:
+            continue
+        ranges = edges.setdefault(target, [])
+        if len(label) == 1:
+            ranges.append((ord(label), ord(label)))
+        ranges.extend(column_ranges.get(column, ()))
+    for target, ranges in edges.items():
+        edges[target] = merge_ranges(ranges)
+    return edges
+
+
+def _condition(ranges):
+    chars = [chr(first) for first, last in ranges if first == last]
+    parts = []
+    if len(chars) == 1:
+        parts.append(f'c == {chars[0]!r}')
+    elif chars:
+        parts.append('c in {' + ', '.join(map(repr, chars)) + '}')
+    for first, last in ranges:
+        if first != last:
+            parts.append(f'{chr(first)!r} <= c <= {chr(last)!r}')
+    return ' or '.join(parts)
+
+
+def _literal_run(dfa, edges, state):
+    # follow states with a single one-character edge while they do not accept
+    run = []
+    seen = {state}
+    while not dfa.accept[state] and len(edges[state]) == 1:
+        (target, ranges), = edges[state].items()
+        if len(ranges) != 1 or ranges[0][0] != ranges[0][1] or target in seen:
+            break
+        run.append(chr(ranges[0][0]))
+        state = target
+        seen.add(target)
+    return ''.join(run), state
+
+
+def _state_block(dfa, state, edges, indent, longest):
+    # with longest=True the block records ``end`` on entering accepting states
+    pad = ' ' * indent
+    fail = 'return end' if longest else 'return False'
+    lines = []
+    for j, (target, ranges) in enumerate(edges[state].items()):
+        lines.append(f"{pad}{'if' if j == 0 else 'elif'} {_condition(ranges)}:")
+        lines.append(f'{pad}    state = {target}')
+        if longest and dfa.accept[target]:
+            lines.append(f'{pad}    end = i')
+    if lines:
+        lines += [f'{pad}else:', f'{pad}    {fail}']
+    else:
+        lines.append(f'{pad}{fail}')
+    return lines
+
+
+def _dispatch(dfa, states, edges, indent, longest):
+    pad = ' ' * indent
+    if len(states) == 1:
+        return _state_block(dfa, states[0], edges, indent, longest)
+    lines = []
+    if len(states) <= CHAIN:
+        for j, state in enumerate(states):
+            if j == 0:
+                lines.append(f'{pad}if state == {state}:')
+            elif j < len(states) - 1:
+                lines.append(f'{pad}elif state == {state}:')
+            else:
+                lines.append(f'{pad}else:')
+            lines += _state_block(dfa, state, edges, indent + 4, longest)
+        return lines
+    middle = len(states) // 2
+    lines.append(f'{pad}if state < {states[middle]}:')
+    lines += _dispatch(dfa, states[:middle], edges, indent + 4, longest)
+    lines.append(f'{pad}else:')
+    lines += _dispatch(dfa, states[middle:], edges, indent + 4, longest)
+    return lines
+
+
+def _function(dfa, edges, longest):
+    name = 'longest_prefix' if longest else 'accepts'
+    lines = [f'def {name}(string):']
+    state = dfa.start
+    if state == DEAD:
+        lines.append('    return -1' if longest else '    return False')
+        return lines
+
+    run, state = _literal_run(dfa, edges, state)
+    skip = len(run)
+    if run:
+        lines += [f'    if not string.startswith({run!r}):',
+                  '        return -1' if longest else '        return False']
+    text = f'string[{skip}:]' if skip else 'string'
+    reachable = [state]
+    seen = {state}
+    for current in reachable:
+        for target in edges[current]:
+            if target not in seen:
+                seen.add(target)
+                reachable.append(target)
+
+    lines.append(f'    state = {state}')
+    if longest:
+        lines.append(f'    end = {skip if dfa.accept[state] else -1}')
+        lines.append(f'    for i, c in enumerate({text}, {skip + 1}):')
+    else:
+        lines.append(f'    for c in {text}:')
+    lines += _dispatch(dfa, sorted(reachable), edges, 8, longest)
+    if longest:
+        lines.append('    return end')
+    else:
+        accepting = sorted(s for s in reachable if dfa.accept[s])
+        lines.append(f"    return state in {{{', '.join(map(str, accepting))}}}" if accepting
+                     else '    return False')
+    return lines
+
+
+def generate(dfa, header=''):
+    """Return Python source defining ``accepts(string)`` and
+    ``longest_prefix(string)`` for ``dfa``."""
+    if not isinstance(dfa, TableDFA):
+        dfa = dfa.compile()
+    column_ranges = {}
+    for first, last, column in dfa.ranges:
+        column_ranges.setdefault(column, []).append((first, last))
+    edges = {state: _edges(dfa, state, column_ranges) for state in range(1, dfa.num_states)}
+    lines = [header] if header else []
+    lines += _function(dfa, edges, longest=False)
+    lines.append('')
+    lines += _function(dfa, edges, longest=True)
+    return '\n'.join(lines) + '\n'
+
+
+class GeneratedDFA:
+    """Matcher running the function generated for a TableDFA.
+
+    Has the ``accepts``/``longest_prefix`` interface of the other matchers.
+    """
+
+    def __init__(self, dfa, source=None, filename='<codegen>'):
+        if not isinstance(dfa, TableDFA):
+            dfa = dfa.compile()
+        if dfa.num_states > MAX_STATES:
+            raise ValueError(f"DFA too large for code generation ({dfa.num_states} states)")
+        self.dfa = dfa
+        self.source = generate(dfa) if source is None else source
+        namespace = {}
+        exec(compile(self.source, filename, 'exec'), namespace)
+        self.accepts = namespace['accepts']
+        self.longest_prefix = namespace['longest_prefix']
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _header(dfa, body):
+    # the body's hash makes a truncated or half-written file fail the check
+    return f'# codegen {VERSION} {_digest(serialize.dumps(dfa))} {_digest(body.encode("utf-8"))}'
+
+
+def _read_cache(dfa, cache):
+    try:
+        with open(cache, encoding='utf-8') as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+    header, _, body = source.partition('\n')
+    return source if header == _header(dfa, body) else None
+
+
+def _write_cache(cache, source):
+    # write next to the target and rename, so readers never see a partial file
+    fd, path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache)),
+                                prefix=os.path.basename(cache) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(source)
+        os.replace(path, cache)
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+
+
+def compile_dfa(dfa, cache=None):
+    """Generate and compile the matcher for ``dfa``.
+
+    With ``cache``, a file path, the source is read from there when it was
+    generated for this same automaton and is intact; otherwise, or when it
+    does not compile, it is generated again and written there atomically.
+    """
+    if not isinstance(dfa, TableDFA):
+        dfa = dfa.compile()
+    if cache is None:
+        return GeneratedDFA(dfa)
+    source = _read_cache(dfa, cache)
+    if source is not None:
+        try:
+            return GeneratedDFA(dfa, source, cache)
+        except (SyntaxError, KeyError):
+            pass
+    body = generate(dfa)
+    source = _header(dfa, body) + '\n' + body
+    _write_cache(cache, source)
+    return GeneratedDFA(dfa, source, cache)
+
+
+def load(path):
+    """Load the automaton serialized at ``path`` and compile it, caching the
+    source next to it as ``path + '.py'``."""
+    return compile_dfa(serialize.load(path), path + '.py')
@@ -0,0 +1,210 @@
+"""Boolean operations and equivalence checks on TableDFAs.
+
+The operations build the product automaton on the fly, keeping only the
+state pairs reachable from the pair of start states. Both operands are
+read over a joint alphabet: the equivalence classes of the code points
+their columns cover, plus, where needed, one class for everything else.
+"""
+from array import array
+from collections import deque
+
+from dfa_table import DEAD, TableDFA
+from nfa_table import partition
+from regex_ast import MAX_CODE
+
+ANYTHING = ((0, MAX_CODE),)
+
+
+def _compiled(dfa):
+    return dfa if isinstance(dfa, TableDFA) else dfa.compile()
+
+
+def _column_intervals(dfa):
+    # column -> tuple of (first, last) code point ranges it is read on
+    ranged = {}
+    for first, last, column in dfa.ranges:
+        ranged.setdefault(column, []).append((first, last))
+    columns = {}
+    for column, label in enumerate(dfa.alphabet):
+        if column in ranged:
+            columns[column] = tuple(sorted(ranged[column]))
+        elif len(label) == 1:
+            columns[column] = ((ord(label), ord(label)),)
+    return columns
+
+
+def joint_alphabet(dfas, total=False):
+    """Split the symbols of ``dfas`` into classes no operand distinguishes.
+
+    Returns the class labels, their ``(first, last)`` ranges, and for every
+    DFA a list giving its column for each class (None where the class leads
+    it to the dead state). With ``total=True`` the classes cover every code
+    point.
+    """
+    per_dfa = [_column_intervals(dfa) for dfa in dfas]
+    labels = list(dict.fromkeys(intervals for columns in per_dfa for intervals in columns.values()))
+    if total:
+        labels.append(ANYTHING)
+    classes, covers = partition(labels)
+    names = sorted(classes, key=lambda name: classes[name][0])
+    position = {name: i for i, name in enumerate(names)}
+    lookups = []
+    for columns in per_dfa:
+        lookup = [None] * len(names)
+        for column, intervals in columns.items():
+            for name in covers[intervals]:
+                lookup[position[name]] = column
+        lookups.append(lookup)
+    return names, [classes[name] for name in names], lookups
+
+
+def _product(dfas, accepting, dead, total=False):
+    """Reachable part of the product of ``dfas``.
+
+    ``accepting(flags)`` and ``dead(states)`` get the accept flags and the
+    states of one tuple of component states.
+    """
+    names, ranges, lookups = joint_alphabet(dfas, total)
+    width = len(names)
+
+    def step(states, symbol):
+        return tuple(DEAD if lookup[symbol] is None else dfa.table[state * dfa.width + lookup[symbol]]
+                     for dfa, lookup, state in zip(dfas, lookups, states))
+
+    start = tuple(dfa.start for dfa in dfas)
+    index = {}
+    order = []
+    if not dead(start):
+        index[start] = 1
+        order.append(start)
+    table = array('i', [DEAD]) * width
+    accept = bytearray([0])
+    for states in order:
+        accept.append(1 if accepting([dfa.accept[state] for dfa, state in zip(dfas, states)]) else 0)
+        for symbol in range(width):
+            target = step(states, symbol)
+            if dead(target):
+                table.append(DEAD)
+                continue
+            target_id = index.get(target)
+            if target_id is None:
+                target_id = index[target] = len(order) + 1
+                order.append(target)
+            table.append(target_id)
+
+    class_ranges = [(first, last, column) for column, name in enumerate(names) if len(name) > 1
+                    for first, last in ranges[column]]
+    return TableDFA(names, table, accept, 1 if order else DEAD, class_ranges)
+
+
+def intersection(a, b):
+    return _product([_compiled(a), _compiled(b)], all, lambda states: DEAD in states)
+
+
+def union(a, b):
+    return _product([_compiled(a), _compiled(b)], any,
+                    lambda states: states[0] == DEAD and states[1] == DEAD)
+
+
+def difference(a, b):
+    """DFA for the words ``a`` accepts and ``b`` does not."""
+    return _product([_compiled(a), _compiled(b)], lambda flags: flags[0] and not flags[1],
+                    lambda states: states[0] == DEAD)
+
+
+def complement(a):
+    """DFA for every word ``a`` rejects, over all code points."""
+    return _product([_compiled(a)], lambda flags: not flags[0], lambda states: False, total=True)
+
+
+def _word(parents, node):
+    symbols = []
+    while parents[node] is not None:
+        node, symbol = parents[node]
+        symbols.append(symbol)
+    return ''.join(reversed(symbols))
+
+
+def difference_witness(a, b):
+    """Return a shortest word ``a`` accepts and ``b`` rejects, or None.
+
+    Walks the product breadth first without building it and stops at the
+    first pair that tells the two apart.
+    """
+    a, b = _compiled(a), _compiled(b)
+    _, ranges, (in_a, in_b) = joint_alphabet([a, b])
+    samples = [chr(r[0][0]) for r in ranges]
+    start = (a.start, b.start)
+    if a.start == DEAD:
+        return None
+    parents = {start: None}
+    queue = deque([start])
+    while queue:
+        pair = queue.popleft()
+        p, q = pair
+        if a.accept[p] and not b.accept[q]:
+            return _word(parents, pair)
+        for symbol, sample in enumerate(samples):
+            if in_a[symbol] is None:
+                continue
+            target_p = a.table[p * a.width + in_a[symbol]]
+            if target_p == DEAD:
+                continue
+            target_q = DEAD if in_b[symbol] is None else b.table[q * b.width + in_b[symbol]]
+            target = (target_p, target_q)
+            if target not in parents:
+                parents[target] = (pair, sample)
+                queue.append(target)
+    return None
+
+
+def is_subset(a, b):
+    """True when every word ``a`` accepts is accepted by ``b``."""
+    return difference_witness(a, b) is None
+
+
+def counterexample(a, b):
+    """Return a word accepted by exactly one of ``a`` and ``b``, or None when
+    they accept the same language.
+
+    Hopcroft-Karp: states of both DFAs are merged with union-find as pairs
+    are reached, and a pair is only explored when its states were not
+    already known equivalent, so this is close to linear in the size of
+    the DFAs and needs neither of them minimized.
+    """
+    a, b = _compiled(a), _compiled(b)
+    _, ranges, (in_a, in_b) = joint_alphabet([a, b])
+    samples = [chr(r[0][0]) for r in ranges]
+    # b's states are numbered after a's
+    offset = a.num_states
+    parent = list(range(a.num_states + b.num_states))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    start = (a.start, b.start)
+    parents = {start: None}
+    parent[find(a.start)] = find(b.start + offset)
+    queue = deque([start])
+    while queue:
+        pair = queue.popleft()
+        p, q = pair
+        if a.accept[p] != b.accept[q]:
+            return _word(parents, pair)
+        for symbol, sample in enumerate(samples):
+            target_p = DEAD if in_a[symbol] is None else a.table[p * a.width + in_a[symbol]]
+            target_q = DEAD if in_b[symbol] is None else b.table[q * b.width + in_b[symbol]]
+            root_p, root_q = find(target_p), find(target_q + offset)
+            if root_p != root_q:
+                parent[root_p] = root_q
+                target = (target_p, target_q)
+                parents.setdefault(target, (pair, sample))
+                queue.append(target)
+    return None
+
+
+def equivalent(a, b):
+    return counterexample(a, b) is None
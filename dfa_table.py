@@ -0,0 +1,312 @@
+from array import array
+from bisect import bisect_right
+
+import profiling
+
+DEAD = 0
+
+
+class SymbolMap(dict):
+    """Symbol lookup with a fallback to sorted code point ranges.
+
+    Symbols stored in the dict map directly. A missing single character is
+    looked up by binary search in ``ranges`` (``(first, last, value)``
+    tuples) and cached; anything else maps to None.
+    """
+
+    def __init__(self, entries=(), ranges=()):
+        super().__init__(entries)
+        self.ranges = sorted(ranges)
+        self.starts = [first for first, _, _ in self.ranges]
+
+    def __missing__(self, symbol):
+        if not self.ranges or len(symbol) != 1:
+            return None
+        code = ord(symbol)
+        i = bisect_right(self.starts, code) - 1
+        if i < 0 or code > self.ranges[i][1]:
+            return None
+        value = self[symbol] = self.ranges[i][2]
+        return value
+
+
+class TableDFA:
+    """DFA compiled to integer states and a flat transition table.
+
+    State 0 is the dead state. ``table[state * width + symbol]`` is the next
+    state and ``accept[state]`` is 1 for accepting states. Each column is
+    one symbol of ``alphabet``; columns that stand for a character class are
+    also reached through the code point ``ranges`` ``(first, last, column)``.
+    """
+
+    def __init__(self, alphabet, table, accept, start, ranges=()):
+        self.alphabet = list(alphabet)
+        self.symbol_ids = SymbolMap(((symbol, i) for i, symbol in enumerate(self.alphabet)), ranges)
+        self.width = len(self.alphabet)
+        self.table = table
+        self.accept = accept
+        self.start = start
+
+    @property
+    def num_states(self):
+        return len(self.accept)
+
+    @property
+    def num_transitions(self):
+        return sum(1 for target in self.table if target != DEAD)
+
+    @property
+    def ranges(self):
+        return self.symbol_ids.ranges
+
+    def next_state(self, state, symbol):
+        column = self.symbol_ids[symbol]
+        if column is None:
+            return DEAD
+        return self.table[state * self.width + column]
+
+    def run(self, string, state=None):
+        table = self.table
+        width = self.width
+        symbol_ids = self.symbol_ids
+        if state is None:
+            state = self.start
+        for symbol in string:
+            column = symbol_ids[symbol]
+            if column is None:
+                return DEAD
+            state = table[state * width + column]
+            if state == DEAD:
+                return DEAD
+        return state
+
+    def accepts(self, string):
+        if profiling.current is not None:
+            state, steps = self.scan(string)
+            profiling.current.count('dfa_steps', steps)
+            return bool(self.accept[state])
+        return bool(self.accept[self.run(string)])
+
+    def scan(self, string):
+        """Like run, but also returns the number of symbols consumed."""
+        table = self.table
+        width = self.width
+        symbol_ids = self.symbol_ids
+        state = self.start
+        steps = 0
+        for symbol in string:
+            column = symbol_ids[symbol]
+            if column is None:
+                return DEAD, steps
+            state = table[state * width + column]
+            steps += 1
+            if state == DEAD:
+                break
+        return state, steps
+
+    def longest_prefix(self, string):
+        """Return the length of the longest accepted prefix, or -1."""
+        table = self.table
+        width = self.width
+        symbol_ids = self.symbol_ids
+        accept = self.accept
+        state = self.start
+        end = 0 if accept[state] else -1
+        for position, symbol in enumerate(string, 1):
+            column = symbol_ids[symbol]
+            if column is None:
+                break
+            state = table[state * width + column]
+            if state == DEAD:
+                break
+            if accept[state]:
+                end = position
+        return end
+
+
+def from_dfa(dfa):
+    """Compile a DFA whose states carry a ``transitions`` dict into a TableDFA."""
+    ids = {dfa.start_state: 1}
+    order = [dfa.start_state]
+    alphabet = set()
+    for state in order:
+        for symbol, next_state in state.transitions.items():
+            alphabet.add(symbol)
+            if next_state not in ids:
+                ids[next_state] = len(order) + 1
+                order.append(next_state)
+
+    alphabet = sorted(alphabet)
+    columns = {symbol: i for i, symbol in enumerate(alphabet)}
+    width = len(alphabet)
+    table = array('i', [DEAD]) * ((len(order) + 1) * width)
+    accept = bytearray(len(order) + 1)
+    accept_states = set(dfa.accept_states)
+    for state in order:
+        row = ids[state] * width
+        for symbol, next_state in state.transitions.items():
+            table[row + columns[symbol]] = ids[next_state]
+        if state in accept_states:
+            accept[ids[state]] = 1
+
+    return TableDFA(alphabet, table, accept, ids[dfa.start_state])
+
+
+def _minimal_counts(result):
+    table = result[0]
+    return {'min_states': table.num_states - 1, 'min_transitions': table.num_transitions}
+
+
+@profiling.stage('hopcroft', _minimal_counts)
+def hopcroft(dfa, labels=None):
+    """Hopcroft minimization of a TableDFA.
+
+    Returns the minimal TableDFA, numbered breadth-first from the start state
+    with the dead state kept at 0, and a list mapping every old state to its
+    new number (-1 for unreachable states). With ``labels``, a per-state
+    sequence, only states with equal labels are merged.
+    """
+    width = dfa.width
+    table = dfa.table
+
+    reachable = [DEAD, dfa.start] if dfa.start != DEAD else [DEAD]
+    seen = set(reachable)
+    for state in reachable:
+        row = state * width
+        for column in range(width):
+            target = table[row + column]
+            if target not in seen:
+                seen.add(target)
+                reachable.append(target)
+
+    inverse = [{} for _ in range(width)]
+    for state in reachable:
+        row = state * width
+        for column in range(width):
+            inverse[column].setdefault(table[row + column], []).append(state)
+
+    if labels is None:
+        labels = dfa.accept
+    groups = {}
+    for state in reachable:
+        groups.setdefault(labels[state], set()).add(state)
+    blocks = list(groups.values())
+    block_of = {}
+    for i, block in enumerate(blocks):
+        for state in block:
+            block_of[state] = i
+
+    # every initial block but the largest splits the others
+    largest = max(range(len(blocks)), key=lambda i: len(blocks[i]))
+    worklist = [(i, column) for i in range(len(blocks)) if i != largest for column in range(width)]
+    pending = set(worklist)
+
+    while worklist:
+        splitter = worklist.pop()
+        pending.discard(splitter)
+        block_id, column = splitter
+        predecessors = inverse[column]
+        touched = {}
+        for state in blocks[block_id]:
+            for source in predecessors.get(state, ()):
+                touched.setdefault(block_of[source], set()).add(source)
+
+        for old_id, inside in touched.items():
+            old_block = blocks[old_id]
+            if len(inside) == len(old_block):
+                continue
+            old_block -= inside
+            new_id = len(blocks)
+            blocks.append(inside)
+            for state in inside:
+                block_of[state] = new_id
+            for c in range(width):
+                if (old_id, c) in pending:
+                    added = (new_id, c)
+                elif len(inside) <= len(old_block):
+                    added = (new_id, c)
+                else:
+                    added = (old_id, c)
+                pending.add(added)
+                worklist.append(added)
+
+    numbering = {block_of[DEAD]: DEAD}
+    order = [block_of[DEAD]]
+    start_block = block_of[dfa.start]
+    if start_block not in numbering:
+        numbering[start_block] = 1
+        order.append(start_block)
+    new_table = array('i')
+    accept = bytearray()
+    for block_id in order:
+        state = next(iter(blocks[block_id]))
+        row = state * width
+        for column in range(width):
+            target_block = block_of[table[row + column]]
+            if target_block not in numbering:
+                numbering[target_block] = len(order)
+                order.append(target_block)
+            new_table.append(numbering[target_block])
+        accept.append(dfa.accept[state])
+
+    mapping = [-1] * dfa.num_states
+    for state in reachable:
+        mapping[state] = numbering[block_of[state]]
+    return TableDFA(dfa.alphabet, new_table, accept, numbering[start_block], dfa.ranges), mapping
+
+
+def minimize(dfa):
+    return hopcroft(dfa)[0]
+
+
+class _ColumnMap(dict):
+    # str.translate table: known symbols map to their column, anything else
+    # to the extra column that leads to the dead state
+    def __init__(self, dfa):
+        super().__init__()
+        self.symbol_ids = dfa.symbol_ids
+        self.unknown = dfa.width
+
+    def __missing__(self, key):
+        column = self.symbol_ids[chr(key)]
+        value = self[key] = chr(self.unknown if column is None else column)
+        return value
+
+
+def match_many(dfa, strings):
+    """Full-match every string in ``strings`` against ``dfa`` in lockstep.
+
+    Returns a NumPy bool array, or a list of bools when NumPy is missing.
+    """
+    if not isinstance(dfa, TableDFA):
+        dfa = dfa.compile()
+    strings = list(strings)
+    try:
+        import numpy as np
+    except ImportError:
+        return [dfa.accepts(string) for string in strings]
+
+    count = len(strings)
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=count)
+    longest = int(lengths.max()) if count else 0
+    flat = ''.join(strings).translate(_ColumnMap(dfa)).encode('utf-32-le')
+    # one row per position so each lockstep step reads contiguous codes
+    codes = np.zeros((longest, count), dtype=np.int32)
+    codes.T[np.arange(longest) < lengths[:, None]] = np.frombuffer(flat, dtype=np.uint32)
+
+    width = dfa.width + 1
+    table = np.zeros((dfa.num_states, width), dtype=np.int32)
+    table[:, :dfa.width] = np.frombuffer(dfa.table, dtype=np.int32).reshape(dfa.num_states, dfa.width)
+    table = table.ravel()
+    accept = np.frombuffer(bytes(dfa.accept), dtype=np.uint8).astype(bool)
+
+    states = np.full(count, dfa.start, dtype=np.int32)
+    active = np.arange(count)
+    for position in range(longest):
+        active = active[lengths[active] > position]
+        if not active.size:
+            break
+        next_states = table[states[active] * width + codes[position, active]]
+        states[active] = next_states
+        active = active[next_states != DEAD]
+    return accept[states]
@@ -0,0 +1,136 @@
+"""Streaming Graphviz DOT export for compiled automata.
+
+States keep their integer numbers from the TableDFA or NFATable, so the
+same automaton always gives the same file. All edges between two states
+are written as one edge whose label lists the characters as ranges, and
+the output is written state by state, so memory stays bounded however big
+the automaton is. The graphviz package is only imported by ``render``.
+"""
+import io
+
+from dfa_table import DEAD, TableDFA
+from nfa_table import EPSILON, NFATable, describe, merge_ranges
+
+# states written before the rest is summarized in one node
+MAX_STATES = 10000
+# characters of an edge label before it is cut short
+MAX_LABEL = 40
+
+
+def _compiled(automaton):
+    if isinstance(automaton, (TableDFA, NFATable)):
+        return automaton
+    return automaton.compile()
+
+
+def _quote(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def _label(ranges, others, max_label):
+    merged = merge_ranges(ranges)
+    parts = [describe(merged)] if merged else []
+    label = ','.join(parts + sorted(others))
+    if len(label) > max_label:
+        label = label[:max_label - 1] + '…'
+    return label
+
+
+def _label_ranges(labels, class_ranges):
+    # label -> (code point ranges, names); labels that are neither a single
+    # character nor a class are written under their own name
+    ranges = {}
+    for first, last, label in class_ranges:
+        ranges.setdefault(label, ([], ()))[0].append((first, last))
+    for label in labels:
+        if label not in ranges:
+            ranges[label] = ([(ord(label), ord(label))], ()) if len(label) == 1 else ([], (label,))
+    return ranges
+
+
+def _add(targets, target, label):
+    ranges, others = targets.setdefault(target, ([], set()))
+    ranges.extend(label[0])
+    others.update(label[1])
+
+
+def _dfa_edges(dfa):
+    labels = _label_ranges(dfa.alphabet, [(first, last, dfa.alphabet[column])
+                                          for first, last, column in dfa.ranges])
+    columns = [labels[label] for label in dfa.alphabet]
+    for state in range(1, dfa.num_states):
+        targets = {}
+        row = state * dfa.width
+        for column in range(dfa.width):
+            target = dfa.table[row + column]
+            if target != DEAD:
+                _add(targets, target, columns[column])
+        yield state, bool(dfa.accept[state]), targets, ()
+
+
+def _nfa_edges(nfa):
+    labels = _label_ranges(nfa.symbols, nfa.class_ranges)
+    for state in range(len(nfa)):
+        targets = {}
+        for label, next_states in nfa.moves[state].items():
+            for target in next_states:
+                _add(targets, target, labels[label])
+        yield state, state == nfa.accept, targets, nfa.epsilon[state]
+
+
+def write_dot(automaton, file, name='automaton', max_states=MAX_STATES, max_label=MAX_LABEL):
+    """Write ``automaton`` (a TableDFA, an NFATable or anything with
+    ``compile()``) to the text file ``file`` as a DOT digraph.
+
+    Only the first ``max_states`` states are written; the rest are counted
+    in one summary node.
+    """
+    automaton = _compiled(automaton)
+    if isinstance(automaton, TableDFA):
+        states, edges = automaton.num_states - 1, _dfa_edges(automaton)
+        start = None if automaton.start == DEAD else automaton.start
+    else:
+        states, edges = len(automaton), _nfa_edges(automaton)
+        start = automaton.start
+
+    write = file.write
+    write(f'digraph {_quote(name)} {{\n')
+    write('  rankdir=LR;\n  node [shape=circle];\n  start [shape=point];\n')
+    if start is not None:
+        write(f'  start -> {start};\n')
+    written = 0
+    for state, accepting, targets, epsilon in edges:
+        if written == max_states:
+            write(f'  more [shape=box, label="{states - written} more states"];\n')
+            break
+        written += 1
+        if accepting:
+            write(f'  {state} [shape=doublecircle];\n')
+        for target, (ranges, others) in targets.items():
+            write(f'  {state} -> {target} [label={_quote(_label(ranges, others, max_label))}];\n')
+        for target in epsilon:
+            write(f'  {state} -> {target} [label="{EPSILON[1]}"];\n')
+    write('}\n')
+
+
+def to_dot(automaton, **options):
+    """Return the DOT source of ``automaton`` as a string."""
+    out = io.StringIO()
+    write_dot(automaton, out, **options)
+    return out.getvalue()
+
+
+def render(automaton, filename, format='png', view=False, **options):
+    """Write the DOT source to ``filename`` and render it with Graphviz.
+
+    Returns the path of the rendered file. Needs the graphviz package and
+    the ``dot`` program.
+    """
+    import graphviz
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        write_dot(automaton, f, **options)
+    output = graphviz.render('dot', format, filename)
+    if view:
+        graphviz.view(output)
+    return output
@@ -0,0 +1,248 @@
+from dfa_table import DEAD, SymbolMap
+from nfa import ArrayNFA
+from nfa_table import bits, partition
+from regex_ast import _thompson, parse, simplify
+
+# DFA slots kept before unreachable ones are worth collecting
+MIN_COMPACT = 256
+
+
+class IncrementalSet:
+    """Set of expressions whose union DFA is updated in place.
+
+    Every expression adds a Thompson fragment to one shared nfa.ArrayNFA.
+    DFA states are NFA state bitmasks and each row is a SymbolMap from an
+    input character to the next DFA state, split over the equivalence
+    classes of the labels leaving that state only. Fragments never reach
+    each other, so adding an expression changes only the start set and
+    determinizes just the sets it makes reachable; removing one takes its
+    NFA states out of the sets that contain them, and sets left empty
+    become dead. Unlike PatternSet the DFA is not minimized; ``freeze()``
+    builds a minimal PatternSet of the current expressions.
+
+    Removed fragments and DFA states that can no longer be reached (old
+    start states among them) stay in place for a while. Once the removed
+    fragments hold half of the NFA states, the NFA is rebuilt from the
+    remaining expressions; once the DFA has twice as many slots as after
+    its last rebuild (and at least MIN_COMPACT), it is determinized again
+    from the start state. Memory thus stays proportional to the live
+    expressions, at an amortized constant factor in time.
+    """
+
+    def __init__(self, expressions=()):
+        self.expressions = {}
+        self.priorities = {}
+        self._reset_nfa()
+        self._reset_dfa()
+        # DFA slots after the last rebuild
+        self._live = 0
+        self._next_id = 0
+        for expression in expressions:
+            self.add(expression)
+
+    def __len__(self):
+        return len(self.expressions)
+
+    def __repr__(self):
+        return f"IncrementalSet({len(self.expressions)} expressions)"
+
+    @property
+    def num_states(self):
+        return len(self.sets)
+
+    def _reset_nfa(self):
+        self.nfa = ArrayNFA()
+        self.moves = []
+        self.epsilon = []
+        self.owner = []
+        self._closures = []
+        self._edges = 0
+        self._epsilons = 0
+        # pattern id -> (bits of its NFA states, start state, accept state)
+        self.fragments = {}
+        self.accepts = {}
+        # NFA states of removed expressions
+        self._garbage = 0
+
+    def _reset_dfa(self):
+        # pattern id -> DFA states whose sets hold some of its NFA states
+        self.members = {pattern_id: [] for pattern_id in self.expressions}
+        self.index = {0: DEAD}
+        self.sets = [0]
+        self.rows = [SymbolMap()]
+        self.tags = [()]
+        self.start = DEAD
+
+    def _add_fragment(self, pattern_id, tree):
+        first_state = self.nfa.num_states
+        start, accept = _thompson(self.nfa, tree)
+        self._sync(pattern_id)
+        fragment = ((1 << self.nfa.num_states) - 1) ^ ((1 << first_state) - 1)
+        self.fragments[pattern_id] = (fragment, start, accept)
+        self.accepts[accept] = pattern_id
+
+    def _sync(self, pattern_id):
+        # pick up the states and edges _thompson appended to the ArrayNFA
+        nfa = self.nfa
+        for _ in range(len(self.moves), nfa.num_states):
+            self.moves.append({})
+            self.epsilon.append([])
+            self.owner.append(pattern_id)
+            self._closures.append(None)
+        symbols = nfa.symbols
+        for i in range(self._edges, len(nfa.edge_src)):
+            moves = self.moves[nfa.edge_src[i]]
+            symbol = symbols[nfa.edge_sym[i]]
+            moves[symbol] = moves.get(symbol, 0) | 1 << nfa.edge_dst[i]
+        for i in range(self._epsilons, len(nfa.eps_src)):
+            self.epsilon[nfa.eps_src[i]].append(nfa.eps_dst[i])
+        self._edges = len(nfa.edge_src)
+        self._epsilons = len(nfa.eps_src)
+
+    def _closure(self, mask):
+        result = mask
+        for state in bits(mask):
+            closure = self._closures[state]
+            if closure is None:
+                closure = 1 << state
+                stack = [state]
+                while stack:
+                    for next_state in self.epsilon[stack.pop()]:
+                        if not closure >> next_state & 1:
+                            closure |= 1 << next_state
+                            stack.append(next_state)
+                self._closures[state] = closure
+            result |= closure
+        return result
+
+    def _state(self, mask, worklist):
+        state = self.index.get(mask)
+        if state is None:
+            state = self.index[mask] = len(self.sets)
+            self.sets.append(mask)
+            self.rows.append(None)
+            self.tags.append(())
+            worklist.append(state)
+        return state
+
+    def _determinize(self, worklist):
+        # fill in the rows of the new states and of the states they reach
+        accepts = self.accepts
+        while worklist:
+            state = worklist.pop()
+            mask = self.sets[state]
+            labels = {}
+            owners = set()
+            for nfa_state in bits(mask):
+                owners.add(self.owner[nfa_state])
+                for label, targets in self.moves[nfa_state].items():
+                    labels[label] = labels.get(label, 0) | targets
+            for pattern_id in owners:
+                self.members[pattern_id].append(state)
+            self.tags[state] = tuple(sorted(accepts[nfa_state] for nfa_state in bits(mask)
+                                            if nfa_state in accepts))
+
+            classes, covers = partition(list(labels))
+            targets = {}
+            for label, target_mask in labels.items():
+                for name in covers[label]:
+                    targets[name] = targets.get(name, 0) | target_mask
+            entries = []
+            ranges = []
+            for name, target_mask in targets.items():
+                target = self._state(self._closure(target_mask), worklist)
+                if len(name) == 1:
+                    entries.append((name, target))
+                else:
+                    ranges.extend((first, last, target) for first, last in classes[name])
+            self.rows[state] = SymbolMap(entries, ranges)
+
+    def _update(self):
+        # collect garbage when there is enough of it, then recompute the start
+        if 2 * self._garbage > self.nfa.num_states:
+            self._reset_nfa()
+            for pattern_id, expression in self.expressions.items():
+                self._add_fragment(pattern_id, simplify(parse(expression)))
+            self._reset_dfa()
+        elif len(self.sets) > max(2 * self._live, MIN_COMPACT):
+            self._reset_dfa()
+        else:
+            self._set_start()
+            return
+        self._set_start()
+        self._live = len(self.sets)
+
+    def _set_start(self):
+        mask = 0
+        for _, start, _ in self.fragments.values():
+            mask |= self._closure(1 << start)
+        worklist = []
+        self.start = self._state(mask, worklist)
+        self._determinize(worklist)
+
+    def add(self, expression, priority=None):
+        """Add ``expression`` and return its id; ``priority`` (lower wins,
+        default: the id) decides ``first``."""
+        tree = simplify(parse(expression))
+        pattern_id = self._next_id
+        self._next_id += 1
+        self._add_fragment(pattern_id, tree)
+        self.members[pattern_id] = []
+        self.expressions[pattern_id] = expression
+        self.priorities[pattern_id] = pattern_id if priority is None else priority
+        self._update()
+        return pattern_id
+
+    def remove(self, pattern_id):
+        """Remove the expression with id ``pattern_id``.
+
+        Only the DFA states whose sets hold its NFA states are touched. A
+        state keeping other NFA states may end up equal to another one;
+        both then behave the same, so they are left as they are.
+        """
+        fragment, _, accept = self.fragments.pop(pattern_id)
+        del self.expressions[pattern_id]
+        del self.priorities[pattern_id]
+        del self.accepts[accept]
+        self._garbage += bin(fragment).count('1')
+        for state in self.members.pop(pattern_id):
+            mask = self.sets[state]
+            if not mask & fragment:
+                continue
+            if self.index.get(mask) == state:
+                del self.index[mask]
+            mask &= ~fragment
+            self.sets[state] = mask
+            if mask:
+                self.index.setdefault(mask, state)
+                self.tags[state] = tuple(tag for tag in self.tags[state] if tag != pattern_id)
+            else:
+                self.rows[state] = SymbolMap()
+                self.tags[state] = ()
+        self._update()
+
+    def run(self, string):
+        """Return the DFA state reached after reading ``string``."""
+        rows = self.rows
+        state = self.start
+        for symbol in string:
+            state = rows[state][symbol]
+            if state is None:
+                return DEAD
+        return state
+
+    def matches(self, string):
+        """Return the sorted ids of the expressions that match ``string``."""
+        return list(self.tags[self.run(string)])
+
+    def first(self, string):
+        """Return the id of the highest priority expression matching
+        ``string``, or None."""
+        tags = self.tags[self.run(string)]
+        return min(tags, key=self.priorities.__getitem__) if tags else None
+
+    def freeze(self):
+        """Build a minimized PatternSet of the current expressions, in id order."""
+        from pattern import PatternSet
+        ids = sorted(self.expressions)
+        return PatternSet([self.expressions[i] for i in ids], [self.priorities[i] for i in ids])
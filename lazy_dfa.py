@@ -0,0 +1,93 @@
+class LazyDFA:
+    """DFA built from an NFATable while matching.
+
+    DFA states are NFA state bitmasks and their transitions are filled in the
+    first time a symbol is read from them. When more than ``max_states``
+    states are cached the cache is flushed; if a flush comes less than
+    ``min_progress`` symbols after the previous one, the rest of that input is
+    matched with the bit-parallel NFA instead.
+    """
+
+    def __init__(self, nfa, max_states=10000, min_progress=None):
+        self.simulator = nfa.bit_parallel()
+        self.start = self.simulator.start
+        self.accept = self.simulator.accept
+        self.max_states = max_states
+        self.min_progress = 10 * max_states if min_progress is None else min_progress
+        self.transitions = {}
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.fallbacks = 0
+        self.scanned = 0
+        self._flush_mark = 0
+
+    def stats(self):
+        return {
+            'states': len(self.transitions),
+            'hits': self.hits,
+            'misses': self.misses,
+            'flushes': self.flushes,
+            'fallbacks': self.fallbacks,
+        }
+
+    def clear(self):
+        self.transitions = {}
+
+    def _row(self, state, position):
+        row = self.transitions.get(state)
+        if row is not None:
+            return row
+        if len(self.transitions) >= self.max_states:
+            mark = self.scanned + position
+            thrashing = self.flushes and mark - self._flush_mark < self.min_progress
+            self.transitions = {}
+            self.flushes += 1
+            self._flush_mark = mark
+            if thrashing:
+                return None
+        row = self.transitions[state] = {}
+        return row
+
+    def _scan(self, string, longest=False):
+        # returns the final state mask and, with longest=True, the end of the
+        # longest accepted prefix (-1 if none)
+        accept = self.accept
+        current = self.start
+        end = 0 if longest and current & accept else -1
+        row = self._row(current, 0)
+        step = self.simulator.step
+        for position, symbol in enumerate(string):
+            if row is None:
+                self.fallbacks += 1
+                for position, symbol in enumerate(string[position:], position):
+                    current = step(current, symbol)
+                    if not current:
+                        break
+                    if longest and current & accept:
+                        end = position + 1
+                break
+            next_state = row.get(symbol)
+            if next_state is None:
+                self.misses += 1
+                next_state = row[symbol] = step(current, symbol)
+            else:
+                self.hits += 1
+            current = next_state
+            if not current:
+                break
+            if longest and current & accept:
+                end = position + 1
+            row = self._row(current, position)
+        self.scanned += len(string)
+        return current, end
+
+    def run(self, string):
+        """Return the NFA state mask reached after reading ``string``."""
+        return self._scan(string)[0]
+
+    def accepts(self, string):
+        return bool(self.run(string) & self.accept)
+
+    def longest_prefix(self, string):
+        return self._scan(string, longest=True)[1]
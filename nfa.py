@@ -1,13 +1,16 @@
-from graphviz import Digraph
+from array import array
+
+import dot
+from nfa_table import NFATable
 
 class State:
-    state_counter = 0
+    __slots__ = ('accept_state', 'transitions', 'id')
 
     def __init__(self, accept_state=False):
         self.accept_state = accept_state
         self.transitions = {}
-        self.id = State.state_counter
-        State.state_counter += 1
+        # numbered per NFA by NFA.get_states
+        self.id = None
 
     def add_transition(self, symbol, state):
         if symbol not in self.transitions:
@@ -18,23 +21,109 @@ class NFA:
     def __init__(self, start_state, accept_state):
         self.start_state = start_state
         self.accept_state = accept_state
+        self._table = None
+
+    def compile(self):
+        if self._table is None:
+            self._table = NFATable(self)
+        return self._table
 
     def get_states(self):
         visited = set()
         states = []
-
-        def dfs(state):
+        stack = [self.start_state]
+        while stack:
+            state = stack.pop()
             if state in visited:
-                return
+                continue
             visited.add(state)
+            state.id = len(states)
             states.append(state)
-            for transitions in state.transitions.values():
-                for next_state in transitions:
-                    dfs(next_state)
-
-        dfs(self.start_state)
+            for transitions in reversed(list(state.transitions.values())):
+                stack.extend(reversed(transitions))
         return states
 
+class ArrayNFA:
+    """NFA stored as parallel integer arrays instead of State objects.
+
+    Symbol edges are ``edge_src[i] --symbols[edge_sym[i]]--> edge_dst[i]``
+    and epsilon edges ``eps_src[i] --> eps_dst[i]``. States are plain ints
+    numbered from 0 within each NFA.
+    """
+
+    def __init__(self):
+        self.num_states = 0
+        self.symbols = []
+        self.symbol_ids = {}
+        self.edge_src = array('i')
+        self.edge_sym = array('i')
+        self.edge_dst = array('i')
+        self.eps_src = array('i')
+        self.eps_dst = array('i')
+        self.start = None
+        self.accept = None
+        self._table = None
+
+    def add_state(self):
+        self.num_states += 1
+        return self.num_states - 1
+
+    def add_transition(self, source, symbol, target):
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        self.edge_src.append(source)
+        self.edge_sym.append(symbol_id)
+        self.edge_dst.append(target)
+
+    def add_epsilon(self, source, target):
+        self.eps_src.append(source)
+        self.eps_dst.append(target)
+
+    def get_states(self):
+        return range(self.num_states)
+
+    # Thompson construction; a fragment is its (start, accept) pair of states
+
+    def symbol(self, label):
+        start = self.add_state()
+        accept = self.add_state()
+        self.add_transition(start, label, accept)
+        return start, accept
+
+    def empty(self):
+        state = self.add_state()
+        return state, state
+
+    def star(self, fragment):
+        inner_start, inner_accept = fragment
+        start = self.add_state()
+        accept = self.add_state()
+        self.add_epsilon(start, inner_start)
+        self.add_epsilon(start, accept)
+        self.add_epsilon(inner_accept, inner_start)
+        self.add_epsilon(inner_accept, accept)
+        return start, accept
+
+    def concat(self, fragments):
+        for (_, left_accept), (right_start, _) in zip(fragments, fragments[1:]):
+            self.add_epsilon(left_accept, right_start)
+        return fragments[0][0], fragments[-1][1]
+
+    def union(self, fragments):
+        start = self.add_state()
+        accept = self.add_state()
+        for part_start, part_accept in fragments:
+            self.add_epsilon(start, part_start)
+            self.add_epsilon(part_accept, accept)
+        return start, accept
+
+    def compile(self):
+        if self._table is None:
+            self._table = NFATable.from_arrays(self)
+        return self._table
+
 def postfix_to_nfa(expression):
     stack = []
     for char in expression:
@@ -57,6 +146,14 @@ def postfix_to_nfa(expression):
             nfa.accept_state.add_transition('ε', nfa.start_state)
             nfa.accept_state.add_transition('ε', new_accept_state)
             stack.append(NFA(new_start_state, new_accept_state))
+        elif char == '?':
+            nfa = stack.pop()
+            new_start_state = State()
+            new_accept_state = State(accept_state=True)
+            new_start_state.add_transition('ε', nfa.start_state)
+            new_start_state.add_transition('ε', new_accept_state)
+            nfa.accept_state.add_transition('ε', new_accept_state)
+            stack.append(NFA(new_start_state, new_accept_state))
         elif char == '.':
             right = stack.pop()
             left = stack.pop()
@@ -71,22 +168,23 @@ def postfix_to_nfa(expression):
     nfa = stack.pop()
     return nfa
 
-def visualize_nfa(nfa):
-    graph = Digraph(format='png')
-
-    states = nfa.get_states()
-
-    for state in states:
-        if state.accept_state:
-            graph.node(str(state.id), shape='doublecircle')
+def postfix_to_array_nfa(expression):
+    nfa = ArrayNFA()
+    stack = []
+    for char in expression:
+        if char in '|.':
+            right = stack.pop()
+            left = stack.pop()
+            stack.append(nfa.union([left, right]) if char == '|' else nfa.concat([left, right]))
+        elif char == '*':
+            stack.append(nfa.star(stack.pop()))
+        elif char == '?':
+            stack.append(nfa.union([stack.pop(), nfa.empty()]))
         else:
-            graph.node(str(state.id), shape='circle')
+            stack.append(nfa.symbol(char))
 
-    graph.edge('', str(nfa.start_state.id))
-
-    for state in states:
-        for symbol, transitions in state.transitions.items():
-            for next_state in transitions:
-                graph.edge(str(state.id), str(next_state.id), label=symbol)
+    nfa.start, nfa.accept = stack.pop()
+    return nfa
 
-    graph.render('nfa', view=True)
+def visualize_nfa(nfa, filename='nfa', view=True):
+    return dot.render(nfa, filename, format='png', view=view, name='nfa')
@@ -0,0 +1,449 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+import profiling
+from dfa_table import DEAD, SymbolMap, TableDFA
+
+EPSILON = ('', 'ε')
+
+
+def final_state(nfa):
+    # AFD.NFA calls it end_state, nfa.NFA calls it accept_state
+    if hasattr(nfa, 'end_state'):
+        return nfa.end_state
+    return nfa.accept_state
+
+
+def bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_of(states):
+    """Bitmask of ``states``, built in one pass instead of one shift each."""
+    states = list(states)
+    if not states:
+        return 0
+    flags = bytearray(max(states) // 8 + 1)
+    for state in states:
+        flags[state >> 3] |= 1 << (state & 7)
+    return int.from_bytes(flags, 'little')
+
+
+def pack(mask):
+    """``(offset, mask >> offset)``: a mask of a few nearby states takes a few
+    bytes however high their numbers are."""
+    if not mask:
+        return 0, 0
+    offset = (mask & -mask).bit_length() - 1
+    return offset, mask >> offset
+
+
+def intervals(label):
+    """Code point intervals of an edge label: a character or a tuple of
+    ``(first, last)`` pairs."""
+    if isinstance(label, str):
+        return ((ord(label), ord(label)),)
+    return label
+
+
+def merge_ranges(ranges):
+    """Sort ``(first, last)`` ranges and join those that overlap or touch."""
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def describe(ranges):
+    """Class label for sorted ``(first, last)`` ranges: the character itself
+    when there is only one, otherwise a bracket expression."""
+    if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+        return chr(ranges[0][0])
+    parts = []
+    for first, last in ranges:
+        parts.append(chr(first) if first == last else f'{chr(first)}-{chr(last)}')
+    return '[' + ''.join(parts) + ']'
+
+
+def partition(labels):
+    """Split the code points used by ``labels`` into equivalence classes.
+
+    Two code points are equivalent when exactly the same labels contain
+    them, so no automaton built from these labels can tell them apart.
+    Returns a dict from class label to its sorted ``(first, last)`` ranges
+    and a dict from each label to the class labels it covers.
+    """
+    bounds = sorted({bound for label in labels
+                     for first, last in intervals(label) for bound in (first, last + 1)})
+    covering = [[] for _ in bounds]
+    for i, label in enumerate(labels):
+        for first, last in intervals(label):
+            for segment in range(bisect_left(bounds, first), bisect_left(bounds, last + 1)):
+                covering[segment].append(i)
+
+    groups = {}
+    for segment, members in enumerate(covering):
+        if members:
+            groups.setdefault(tuple(members), []).append((bounds[segment], bounds[segment + 1] - 1))
+
+    classes = {}
+    covers = {label: [] for label in labels}
+    for members, ranges in groups.items():
+        merged = merge_ranges(ranges)
+        name = describe(merged)
+        classes[name] = merged
+        for i in members:
+            covers[labels[i]].append(name)
+    return classes, covers
+
+
+class NFATable:
+    """Thompson NFA renumbered to integer states.
+
+    ``moves[state]`` maps a symbol to the sorted tuple of its targets and
+    ``epsilon[state]`` lists the epsilon successors of ``state``. States are
+    numbered so that a lone symbol edge goes from ``i`` to ``i + 1``.
+    Bitmasks are only built for the state sets of a simulation; cached
+    closures are stored packed, so memory stays linear in the NFA size.
+
+    Edges labelled with code point intervals are split over the alphabet's
+    equivalence classes, and ``symbols`` then lists class labels instead of
+    characters. ``classify`` maps an input character to its class label (it
+    is None when every edge is a single character) and ``class_ranges``
+    holds the ``(first, last, label)`` ranges of the multi-character classes.
+    """
+
+    def __init__(self, nfa):
+        ids = {}
+        self.states = []
+        queue = deque()
+        self._number(nfa.start_state, ids, queue)
+        while queue:
+            state = queue.popleft()
+            for next_states in state.transitions.values():
+                for next_state in next_states:
+                    self._number(next_state, ids, queue)
+
+        self.start = 0
+        self.accept = ids[final_state(nfa)]
+        self.moves = []
+        self.epsilon = []
+        symbols = set()
+        for state in self.states:
+            moves = {}
+            epsilon = []
+            for symbol, next_states in state.transitions.items():
+                if symbol in EPSILON:
+                    epsilon.extend(ids[next_state] for next_state in next_states)
+                    continue
+                moves[symbol] = tuple(sorted({ids[next_state] for next_state in next_states}))
+                symbols.add(symbol)
+            self.moves.append(moves)
+            self.epsilon.append(epsilon)
+        self._set_symbols(symbols)
+        self._reset_caches()
+
+    @classmethod
+    def from_arrays(cls, nfa):
+        """Build the table from an nfa.ArrayNFA without any State objects."""
+        table = cls.__new__(cls)
+        table.states = range(nfa.num_states)
+        table.start = nfa.start
+        table.accept = nfa.accept
+        table.moves = [{} for _ in range(nfa.num_states)]
+        table.epsilon = [[] for _ in range(nfa.num_states)]
+        symbols = nfa.symbols
+        for source, symbol_id, target in zip(nfa.edge_src, nfa.edge_sym, nfa.edge_dst):
+            moves = table.moves[source]
+            symbol = symbols[symbol_id]
+            targets = moves.get(symbol)
+            if targets is None:
+                moves[symbol] = (target,)
+            elif target not in targets:
+                moves[symbol] = tuple(sorted(targets + (target,)))
+        for source, target in zip(nfa.eps_src, nfa.eps_dst):
+            table.epsilon[source].append(target)
+        table._set_symbols(symbols)
+        table._reset_caches()
+        return table
+
+    def _set_symbols(self, labels):
+        self.class_ranges = []
+        self.classify = None
+        if all(isinstance(label, str) for label in labels):
+            self.symbols = sorted(labels)
+            return
+        classes, covers = partition(list(labels))
+        # a single character is always a class of its own, so only interval
+        # edges need splitting
+        for moves in self.moves:
+            if all(isinstance(label, str) for label in moves):
+                continue
+            split = {}
+            for label, targets in moves.items():
+                for name in covers[label]:
+                    split.setdefault(name, set()).update(targets)
+            moves.clear()
+            moves.update((name, tuple(sorted(targets))) for name, targets in split.items())
+        for name, ranges in classes.items():
+            if len(name) > 1:
+                self.class_ranges.extend((first, last, name) for first, last in ranges)
+        self.classify = SymbolMap(((name, name) for name in classes if len(name) == 1),
+                                  self.class_ranges)
+        self.symbols = sorted(classes, key=lambda name: classes[name][0])
+
+    def _reset_caches(self):
+        self._closures = [None] * len(self.states)
+        self._epsilon_free = None
+        self._bit_parallel = None
+
+    def _number(self, state, ids, queue):
+        while state not in ids:
+            ids[state] = len(self.states)
+            self.states.append(state)
+            queue.append(state)
+            targets = [next_states for symbol, next_states in state.transitions.items()
+                       if symbol not in EPSILON]
+            if len(targets) != 1 or len(targets[0]) != 1:
+                break
+            state = targets[0][0]
+
+    def __len__(self):
+        return len(self.states)
+
+    @property
+    def num_transitions(self):
+        return (sum(len(targets) for moves in self.moves for targets in moves.values())
+                + sum(map(len, self.epsilon)))
+
+    def _packed_closure(self, state):
+        closure = self._closures[state]
+        if closure is None:
+            reached = {state}
+            stack = [state]
+            epsilon = self.epsilon
+            while stack:
+                for next_state in epsilon[stack.pop()]:
+                    if next_state not in reached:
+                        reached.add(next_state)
+                        stack.append(next_state)
+            closure = self._closures[state] = pack(mask_of(reached))
+        return closure
+
+    def state_closure(self, state):
+        offset, mask = self._packed_closure(state)
+        return mask << offset
+
+    def closure(self, mask):
+        if profiling.current is not None:
+            profiling.current.count('closure_calls')
+        result = mask
+        for state in bits(mask):
+            offset, closure = self._packed_closure(state)
+            result |= closure << offset
+        return result
+
+    def epsilon_free(self):
+        if self._epsilon_free is None:
+            self._epsilon_free = EpsilonFreeNFA(self)
+        return self._epsilon_free
+
+    def bit_parallel(self):
+        if self._bit_parallel is None:
+            self._bit_parallel = BitParallelNFA(self)
+        return self._bit_parallel
+
+    def to_states(self, mask):
+        return {self.states[i] for i in bits(mask)}
+
+
+class EpsilonFreeNFA:
+    """NFA without epsilon edges, derived from an NFATable.
+
+    ``steps[state][symbol]`` is the packed epsilon closure of the symbol's
+    targets, so a simulation step is one lookup and a union per active state.
+    """
+
+    def __init__(self, nfa):
+        self.start = nfa.closure(1 << nfa.start)
+        self.accept = 1 << nfa.accept
+        self.classify = nfa.classify
+        self.steps = [{symbol: pack(nfa.closure(mask_of(targets))) for symbol, targets in moves.items()}
+                      for moves in nfa.moves]
+
+    def step(self, current, symbol):
+        if self.classify is not None:
+            symbol = self.classify[symbol]
+        steps = self.steps
+        result = 0
+        for state in bits(current):
+            step = steps[state].get(symbol)
+            if step is not None:
+                result |= step[1] << step[0]
+        return result
+
+    def accepts(self, string):
+        current = self.start
+        for symbol in string:
+            current = self.step(current, symbol)
+            if not current:
+                return False
+        return bool(current & self.accept)
+
+
+class BitParallelNFA:
+    """Bit-parallel simulation of an NFATable.
+
+    The active states are one int bitmask. Symbol edges from ``i`` to
+    ``i + 1`` are taken with ``(active & shift[symbol]) << 1``; any other
+    symbol edge is looked up in ``jumps``. Epsilon closures are unions of
+    per-byte closure masks, computed the first time each byte value shows up
+    at a given offset and kept packed.
+    """
+
+    def __init__(self, nfa):
+        self.nfa = nfa
+        self.start = nfa.closure(1 << nfa.start)
+        self.accept = 1 << nfa.accept
+        self.classify = nfa.classify
+        shift = {}
+        jump_sources = {}
+        self.jumps = {}
+        for state, moves in enumerate(nfa.moves):
+            for symbol, targets in moves.items():
+                if targets == (state + 1,):
+                    shift.setdefault(symbol, []).append(state)
+                else:
+                    jump_sources.setdefault(symbol, []).append(state)
+                    self.jumps.setdefault(symbol, {})[state] = pack(mask_of(targets))
+        self.shift = {symbol: mask_of(states) for symbol, states in shift.items()}
+        self.jump_sources = {symbol: mask_of(states) for symbol, states in jump_sources.items()}
+        self.byte_closures = [{} for _ in range((len(nfa) + 7) // 8)]
+
+    def closure(self, mask):
+        result = 0
+        byte_closures = self.byte_closures
+        while mask:
+            offset = ((mask & -mask).bit_length() - 1) >> 3 << 3
+            byte = mask >> offset & 255
+            mask ^= byte << offset
+            cache = byte_closures[offset >> 3]
+            closure = cache.get(byte)
+            if closure is None:
+                closure = cache[byte] = pack(self.nfa.closure(byte << offset))
+            result |= closure[1] << closure[0]
+        return result
+
+    def step(self, active, symbol):
+        if self.classify is not None:
+            symbol = self.classify[symbol]
+        moved = (active & self.shift.get(symbol, 0)) << 1
+        sources = active & self.jump_sources.get(symbol, 0)
+        if sources:
+            jumps = self.jumps[symbol]
+            for state in bits(sources):
+                jump = jumps[state]
+                moved |= jump[1] << jump[0]
+        return self.closure(moved)
+
+    def accepts(self, string):
+        if profiling.current is not None:
+            active, steps = self.scan(string)
+            profiling.current.count('nfa_steps', steps)
+            return bool(active & self.accept)
+        active = self.start
+        for symbol in string:
+            active = self.step(active, symbol)
+            if not active:
+                return False
+        return bool(active & self.accept)
+
+    def scan(self, string):
+        """Return the active mask after ``string`` and the number of steps taken."""
+        active = self.start
+        steps = 0
+        for symbol in string:
+            active = self.step(active, symbol)
+            steps += 1
+            if not active:
+                break
+        return active, steps
+
+    def longest_prefix(self, string):
+        active = self.start
+        end = 0 if active & self.accept else -1
+        for position, symbol in enumerate(string, 1):
+            active = self.step(active, symbol)
+            if not active:
+                break
+            if active & self.accept:
+                end = position
+        return end
+
+
+def nfa_counts(prefix):
+    """Counter for profiling.stage recording the size of the NFA a stage
+    returns (alone or first in a tuple) as ``<prefix>_states`` and
+    ``<prefix>_transitions``."""
+    def count(result):
+        table = (result[0] if isinstance(result, tuple) else result).compile()
+        return {f'{prefix}_states': len(table), f'{prefix}_transitions': table.num_transitions}
+    return count
+
+
+def _dfa_counts(result):
+    table = result[0]
+    return {'dfa_states': table.num_states - 1, 'dfa_transitions': table.num_transitions}
+
+
+@profiling.stage('determinize', _dfa_counts)
+def determinize(nfa):
+    """Subset construction over bitmask state sets.
+
+    Returns the TableDFA and a list mapping each DFA state to its NFA state
+    set (entry 0, the dead state, is the empty set).
+    """
+    alphabet = nfa.symbols
+    columns = {symbol: i for i, symbol in enumerate(alphabet)}
+    width = len(alphabet)
+    moves = nfa.moves
+    accept_bit = 1 << nfa.accept
+
+    start_set = nfa.closure(1 << nfa.start)
+    index = {0: DEAD, start_set: 1}
+    sets = [0, start_set]
+    worklist = deque([start_set])
+    table = array('i', [DEAD]) * width
+    accept = bytearray([0])
+
+    while worklist:
+        current = worklist.popleft()
+        accept.append(1 if current & accept_bit else 0)
+        targets = [0] * width
+        for state in bits(current):
+            for symbol, next_states in moves[state].items():
+                column = columns[symbol]
+                for next_state in next_states:
+                    targets[column] |= 1 << next_state
+        row = array('i', [DEAD]) * width
+        for column, mask in enumerate(targets):
+            if not mask:
+                continue
+            mask = nfa.closure(mask)
+            target = index.get(mask)
+            if target is None:
+                target = index[mask] = len(sets)
+                sets.append(mask)
+                worklist.append(mask)
+            row[column] = target
+        table.extend(row)
+
+    ranges = [(first, last, columns[name]) for first, last, name in nfa.class_ranges]
+    return TableDFA(alphabet, table, accept, 1, ranges), sets
@@ -0,0 +1,144 @@
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from dfa_table import DEAD, TableDFA, minimize
+from stream import StreamMatcher
+
+CHUNK_SIZE = 1 << 24
+
+_matcher = None
+
+
+def _init(dfa):
+    global _matcher
+    _matcher = StreamMatcher(dfa)
+
+
+def _load(source, start, end):
+    # file chunks come as (path, start, end) and are mapped by the worker;
+    # in-memory chunks are sent as data with no offsets
+    if start is None:
+        return source
+    with open(source, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return data[start:end]
+
+
+def _chunk_map(task):
+    """Map every live DFA state to the state reached after reading a chunk.
+
+    All start states are run together, grouped by their current state, so
+    the work shrinks to a single run once they converge.
+    """
+    codes = _matcher._codes(_load(*task))
+    table = _matcher.table
+    width = _matcher.width
+    groups = {state: [state] for state in range(1, _matcher.dfa.num_states)}
+    position = 0
+    while len(groups) > 1 and position < len(codes):
+        code = codes[position]
+        next_groups = {}
+        for state, origins in groups.items():
+            next_state = table[state * width + code]
+            if next_state == DEAD:
+                continue
+            if next_state in next_groups:
+                next_groups[next_state].extend(origins)
+            else:
+                next_groups[next_state] = origins
+        groups = next_groups
+        position += 1
+
+    mapping = [DEAD] * _matcher.dfa.num_states
+    for state, origins in groups.items():
+        for code in codes[position:]:
+            state = table[state * width + code]
+            if state == DEAD:
+                break
+        for origin in origins:
+            mapping[origin] = state
+    return mapping
+
+
+def _chunk_ends(task):
+    """Offsets within a chunk after which the DFA, started in ``state``, accepts."""
+    source, start, end, state = task
+    table = _matcher.table
+    width = _matcher.width
+    accept = _matcher.dfa.accept
+    ends = []
+    for position, code in enumerate(_matcher._codes(_load(source, start, end)), 1):
+        state = table[state * width + code]
+        if state == DEAD:
+            break
+        if accept[state]:
+            ends.append(position)
+    return ends
+
+
+def parallel_scan(dfa, data, workers=None, chunk_size=CHUNK_SIZE, ends=False):
+    """Run ``dfa`` over ``data`` (str or bytes-like) split into chunks on a
+    process pool.
+
+    Workers first compute a state-to-state mapping per chunk; composing them
+    in order gives the exact final state. With ``ends=True`` a second pass
+    collects every offset at which the input read so far is accepted.
+
+    Returns ``(final_state, offsets)``; offsets is None unless requested.
+    """
+    tasks = [(data[start:start + chunk_size], None, None)
+             for start in range(0, len(data), chunk_size)]
+    return _run(dfa, tasks, workers, ends)
+
+
+def parallel_scan_file(dfa, path, workers=None, chunk_size=CHUNK_SIZE, ends=False):
+    """Like parallel_scan, but each worker maps its own slice of ``path``."""
+    size = os.path.getsize(path)
+    tasks = [(os.fspath(path), start, min(start + chunk_size, size))
+             for start in range(0, size, chunk_size)]
+    return _run(dfa, tasks, workers, ends)
+
+
+def _run(dfa, tasks, workers, ends):
+    if not isinstance(dfa, TableDFA):
+        dfa = minimize(dfa.compile())
+    if workers == 1 or len(tasks) <= 1:
+        _init(dfa)
+        return _compose(dfa, tasks, map, ends)
+    with ProcessPoolExecutor(workers, initializer=_init, initargs=(dfa,)) as pool:
+        return _compose(dfa, tasks, pool.map, ends)
+
+
+def _compose(dfa, tasks, map_fn, ends):
+    states = [dfa.start]
+    for mapping in map_fn(_chunk_map, tasks):
+        states.append(mapping[states[-1]])
+    if not ends:
+        return states[-1], None
+
+    offsets = [0] if dfa.accept[dfa.start] else []
+    live = [(task + (state,), task_start)
+            for task, state, task_start in zip(tasks, states, _starts(tasks))
+            if state != DEAD]
+    results = map_fn(_chunk_ends, [task for task, _ in live])
+    for (_, task_start), chunk_ends in zip(live, results):
+        offsets.extend(task_start + end for end in chunk_ends)
+    return states[-1], offsets
+
+
+def _starts(tasks):
+    offset = 0
+    for source, start, end in tasks:
+        if start is not None:
+            yield start
+        else:
+            yield offset
+            offset += len(source)
+
+
+def parallel_accepts(dfa, data, workers=None, chunk_size=CHUNK_SIZE):
+    if not isinstance(dfa, TableDFA):
+        dfa = minimize(dfa.compile())
+    state, _ = parallel_scan(dfa, data, workers, chunk_size)
+    return bool(dfa.accept[state])
@@ -0,0 +1,207 @@
+from collections import OrderedDict
+
+import codegen
+from dfa_table import DEAD, hopcroft, minimize
+from lazy_dfa import LazyDFA
+from nfa_table import bits, determinize
+from regex_ast import literals, parse, simplify, to_nfa, to_union_nfa
+from search import Searcher
+
+ENGINES = ('dfa', 'nfa', 'lazy', 'codegen')
+
+
+class Pattern:
+    """Compiled regular expression.
+
+    ``engine`` picks the matcher: ``'dfa'`` builds the minimal table DFA up
+    front, ``'nfa'`` runs the bit-parallel NFA, ``'lazy'`` builds DFA
+    states on demand and ``'codegen'`` compiles the minimal DFA into Python
+    code (falling back to the table above codegen.MAX_STATES states).
+
+    Before running the matcher, inputs are checked with ``str.startswith``,
+    ``str.endswith`` and ``in`` against the prefix, suffix and required
+    literals of the expression, so most non-matching inputs never reach it.
+    """
+
+    def __init__(self, expression, engine='dfa', max_states=10000):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine!r}")
+        self.expression = expression
+        self.engine = engine
+        self.tree = simplify(parse(expression))
+        self.prefix, self.suffix, self.required = literals(self.tree)
+        nfa = to_nfa(self.tree).compile()
+        if engine == 'dfa':
+            self.matcher = minimize(determinize(nfa)[0])
+        elif engine == 'codegen':
+            dfa = minimize(determinize(nfa)[0])
+            self.matcher = codegen.GeneratedDFA(dfa) if dfa.num_states <= codegen.MAX_STATES else dfa
+        elif engine == 'nfa':
+            self.matcher = nfa.bit_parallel()
+        else:
+            self.matcher = LazyDFA(nfa, max_states=max_states)
+        self._searcher = None
+
+    def __repr__(self):
+        return f"Pattern({self.expression!r}, engine={self.engine!r})"
+
+    def _contains_required(self, string, pos=0, endpos=None):
+        return all(string.find(literal, pos, endpos) >= 0 for literal in self.required)
+
+    def match(self, string):
+        """Return the length of the longest prefix of ``string`` that matches, or None."""
+        if not string.startswith(self.prefix) or not self._contains_required(string):
+            return None
+        end = self.matcher.longest_prefix(string)
+        return None if end < 0 else end
+
+    def fullmatch(self, string):
+        if not (string.startswith(self.prefix) and string.endswith(self.suffix)
+                and self._contains_required(string)):
+            return False
+        return self.matcher.accepts(string)
+
+    @property
+    def searcher(self):
+        # the search DFAs are only built the first time they are needed
+        if self._searcher is None:
+            self._searcher = Searcher(self.tree)
+        return self._searcher
+
+    def search(self, string, pos=0, endpos=None):
+        """Return the ``(start, end)`` span of the leftmost-longest match in
+        ``string``, or None."""
+        if not self._contains_required(string, pos, endpos):
+            return None
+        return self.searcher.search(string, pos, endpos)
+
+    def finditer(self, string, pos=0, endpos=None):
+        """Yield the spans of the non-overlapping leftmost-longest matches."""
+        if not self._contains_required(string, pos, endpos):
+            return iter(())
+        return self.searcher.finditer(string, pos, endpos)
+
+
+class PatternSet:
+    """Many expressions matched together by one tagged DFA.
+
+    The expressions are joined into a single union NFA and determinized
+    once. ``tags[state]`` lists the indices of the expressions a DFA state
+    accepts, and minimization only merges states with the same tags, so a
+    single pass over a string finds every expression that matches it.
+    ``priorities`` (lower wins, default: position) decides ``first``.
+    When every expression has a required literal, strings containing none
+    of them are rejected without running the DFA.
+    """
+
+    def __init__(self, expressions, priorities=None):
+        self.expressions = list(expressions)
+        if priorities is None:
+            priorities = range(len(self.expressions))
+        self.priorities = list(priorities)
+        if len(self.priorities) != len(self.expressions):
+            raise ValueError("Need one priority per expression")
+        trees = [simplify(parse(expression)) for expression in self.expressions]
+        required = [literals(tree)[2] for tree in trees]
+        self.literals = None
+        if all(required):
+            self.literals = sorted({literal[0] for literal in required})
+        nfa, accepts = to_union_nfa(trees)
+        table, sets = determinize(nfa.compile())
+        tagged = 0
+        for state in accepts:
+            tagged |= 1 << state
+        labels = [tuple(sorted(accepts[state] for state in bits(mask & tagged))) for mask in sets]
+        self.dfa, mapping = hopcroft(table, labels)
+        self.tags = [()] * self.dfa.num_states
+        for old, new in enumerate(mapping):
+            if new >= 0:
+                self.tags[new] = labels[old]
+        order = sorted(range(len(self.expressions)), key=self.priorities.__getitem__)
+        rank = {index: position for position, index in enumerate(order)}
+        self.firsts = [min(tags, key=rank.__getitem__) if tags else None for tags in self.tags]
+
+    def __len__(self):
+        return len(self.expressions)
+
+    def __repr__(self):
+        return f"PatternSet({len(self.expressions)} expressions)"
+
+    def _run(self, string):
+        if self.literals is not None and not any(literal in string for literal in self.literals):
+            return DEAD
+        return self.dfa.run(string)
+
+    def matches(self, string):
+        """Return the sorted indices of the expressions that match ``string``."""
+        return list(self.tags[self._run(string)])
+
+    def first(self, string):
+        """Return the index of the highest priority expression matching
+        ``string``, or None."""
+        return self.firsts[self._run(string)]
+
+
+class PatternCache:
+    """LRU cache of compiled patterns keyed on expression and options."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, expression, engine, **options):
+        key = (expression, engine, tuple(sorted(options.items())))
+        pattern = self.entries.get(key)
+        if pattern is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return pattern
+        self.misses += 1
+        pattern = Pattern(expression, engine, **options)
+        if self.maxsize > 0:
+            self.entries[key] = pattern
+            self.resize(self.maxsize)
+        return pattern
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        while len(self.entries) > max(maxsize, 0):
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.entries), 'maxsize': self.maxsize}
+
+
+_cache = PatternCache()
+
+
+def compile(expression, engine='dfa', **options):
+    return _cache.get(expression, engine, **options)
+
+
+def search(expression, string, engine='dfa'):
+    return compile(expression, engine).search(string)
+
+
+def finditer(expression, string, engine='dfa'):
+    return compile(expression, engine).finditer(string)
+
+
+def purge():
+    _cache.clear()
+
+
+def set_cache_size(maxsize):
+    _cache.resize(maxsize)
+
+
+def cache_info():
+    return _cache.info()
@@ -0,0 +1,106 @@
+import functools
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# PipelineStats being collected, or None when profiling is off; instrumented
+# code only checks this before doing any extra work
+current = None
+
+_callbacks = []
+
+
+class PipelineStats:
+    """Measurements from one ``collect()`` block.
+
+    ``stages`` maps a stage name to its call count, total seconds and peak
+    traced memory (only with ``memory=True``); ``counts`` holds state and
+    transition counts, epsilon-closure calls and matcher steps.
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = {}
+        self.counts = {}
+        self._peaks = []
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def run_stage(self, name, fn, args, kwargs, counter):
+        if self.memory:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            # nested stages reset the peak, so keep the enclosing one aside
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = None
+        if self.memory:
+            peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            if started:
+                tracemalloc.stop()
+
+        record = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_bytes': None})
+        record['calls'] += 1
+        record['seconds'] += seconds
+        if peak is not None:
+            record['peak_bytes'] = max(record['peak_bytes'] or 0, peak)
+        metrics = {'seconds': seconds, 'peak_bytes': peak}
+        if counter is not None:
+            for key, value in counter(result).items():
+                self.counts[key] = value
+                metrics[key] = value
+        for callback in _callbacks:
+            callback(name, metrics)
+        return result
+
+    def as_dict(self):
+        return {'stages': {name: dict(record) for name, record in self.stages.items()},
+                'counts': dict(self.counts)}
+
+
+@contextmanager
+def collect(memory=False):
+    """Collect stats for everything run inside the block.
+
+    Yields the PipelineStats being filled in.
+    """
+    global current
+    previous = current
+    current = PipelineStats(memory)
+    try:
+        yield current
+    finally:
+        current = previous
+
+
+def add_callback(callback):
+    """Call ``callback(stage, metrics)`` after every stage run while collecting."""
+    _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    _callbacks.remove(callback)
+
+
+def stage(name, counter=None):
+    """Decorator timing a pipeline stage while stats are being collected.
+
+    ``counter`` turns the stage's result into extra counts to record.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current is None:
+                return fn(*args, **kwargs)
+            return current.run_stage(name, fn, args, kwargs, counter)
+        return wrapper
+    return decorate
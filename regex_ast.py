@@ -0,0 +1,619 @@
+import os
+from collections import deque
+
+import profiling
+from nfa import ArrayNFA
+from nfa_table import merge_ranges, nfa_counts
+
+# Nodes are tuples so equal subtrees compare and hash equal:
+# (LIT, char), (CLS, ranges), (EPS,), (CAT, children), (ALT, children),
+# (STAR, child); ranges are sorted, disjoint (first, last) code point pairs
+LIT = 'lit'
+CLS = 'cls'
+EPS = 'eps'
+CAT = 'cat'
+ALT = 'alt'
+STAR = 'star'
+
+EMPTY = (EPS,)
+OPERATORS = set('|.*+?()\\')
+MAX_CODE = 0x10FFFF
+ANY = (CLS, ((0, MAX_CODE),))
+# classes up to this size can still be spelled out as postfix alternations
+POSTFIX_CLASS_LIMIT = 256
+
+
+class RegexError(ValueError):
+    pass
+
+
+@profiling.stage('parse')
+def parse(expression):
+    """Parse an infix expression into a syntax tree in one left-to-right pass.
+
+    Concatenation may be written with '.' or left implicit; '*', '+' and '?'
+    are postfix repetitions and '\\' makes the next character a literal.
+    '[...]' is a character class of characters and 'a-z' ranges, negated by
+    a leading '^'.
+    Groups are kept on an explicit stack, so nesting depth is not limited by
+    recursion.
+    """
+    # each frame is (finished alternatives, current sequence)
+    frames = [([], [])]
+    escaped = False
+    pending_dot = False
+    i = 0
+    while i < len(expression):
+        c = expression[i]
+        alternatives, sequence = frames[-1]
+        if escaped:
+            sequence.append((LIT, c))
+            escaped = False
+            pending_dot = False
+        elif c == '\\':
+            escaped = True
+        elif c == '[':
+            node, i = _parse_class(expression, i)
+            sequence.append(node)
+            pending_dot = False
+        elif c == '(':
+            frames.append(([], []))
+            pending_dot = False
+        elif c == ')':
+            if len(frames) == 1:
+                raise RegexError(f"Unbalanced ')' at {i}")
+            if pending_dot:
+                raise RegexError(f"'.' without a right operand at {i}")
+            frames.pop()
+            alternatives.append(_sequence(sequence))
+            frames[-1][1].append(_alternation(alternatives))
+        elif c == '|':
+            if pending_dot:
+                raise RegexError(f"'.' without a right operand at {i}")
+            alternatives.append(_sequence(sequence))
+            sequence.clear()
+        elif c == '.':
+            if not sequence or pending_dot:
+                raise RegexError(f"'.' without a left operand at {i}")
+            pending_dot = True
+        elif c in '*+?':
+            if not sequence or pending_dot:
+                raise RegexError(f"'{c}' without an operand at {i}")
+            item = sequence.pop()
+            if c == '*':
+                sequence.append((STAR, item))
+            elif c == '+':
+                sequence.append((CAT, (item, (STAR, item))))
+            else:
+                sequence.append((ALT, (item, EMPTY)))
+        else:
+            sequence.append((LIT, c))
+            pending_dot = False
+        i += 1
+
+    if escaped:
+        raise RegexError("Trailing '\\'")
+    if pending_dot:
+        raise RegexError("'.' without a right operand at the end")
+    if len(frames) != 1:
+        raise RegexError("Unbalanced '('")
+    alternatives, sequence = frames[0]
+    alternatives.append(_sequence(sequence))
+    return _alternation(alternatives)
+
+
+def _parse_class(expression, start):
+    """Parse the class opening at ``start``; returns the node and the index
+    of the closing ']'."""
+    i = start + 1
+    negated = i < len(expression) and expression[i] == '^'
+    if negated:
+        i += 1
+    ranges = []
+    first = None
+    while True:
+        if i >= len(expression):
+            raise RegexError(f"Unterminated '[' at {start}")
+        c = expression[i]
+        # a ']' right after the '[' or '[^' is a literal
+        if c == ']' and i > start + 1 + negated:
+            break
+        if c == '\\':
+            i += 1
+            if i >= len(expression):
+                raise RegexError("Trailing '\\'")
+            c = expression[i]
+        elif c == '-' and first is not None and i + 1 < len(expression) and expression[i + 1] != ']':
+            i += 1
+            last = expression[i]
+            if last == '\\':
+                i += 1
+                if i >= len(expression):
+                    raise RegexError("Trailing '\\'")
+                last = expression[i]
+            if ord(last) < ord(first):
+                raise RegexError(f"Bad range {first}-{last} at {i - 2}")
+            ranges.append((ord(first), ord(last)))
+            first = None
+            i += 1
+            continue
+        if first is not None:
+            ranges.append((ord(first), ord(first)))
+        first = c
+        i += 1
+    if first is not None:
+        ranges.append((ord(first), ord(first)))
+
+    ranges = merge_ranges(ranges)
+    if negated:
+        ranges = _complement(ranges)
+    if not ranges:
+        raise RegexError(f"Empty class at {start}")
+    if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+        return (LIT, chr(ranges[0][0])), i
+    return (CLS, tuple(ranges)), i
+
+
+def _complement(ranges):
+    result = []
+    next_code = 0
+    for first, last in ranges:
+        if first > next_code:
+            result.append((next_code, first - 1))
+        next_code = last + 1
+    if next_code <= MAX_CODE:
+        result.append((next_code, MAX_CODE))
+    return result
+
+
+def _sequence(items):
+    if not items:
+        return EMPTY
+    if len(items) == 1:
+        return items[0]
+    return (CAT, tuple(items))
+
+
+def _alternation(items):
+    if len(items) == 1:
+        return items[0]
+    return (ALT, tuple(items))
+
+
+def simplify(node):
+    """Rewrite ``node`` into an equivalent, smaller tree.
+
+    Nested groups are flattened, empty words dropped from concatenations,
+    repeated stars collapsed, duplicate alternatives removed and common
+    prefixes and suffixes factored out of alternations. Every node removed
+    here is one less Thompson fragment to determinize and minimize. The
+    tree is rewritten bottom up without recursion, like parse, in time
+    close to linear in its size.
+    """
+    memo = _Memo()
+    results = []
+    for node in _postorder(node):
+        kind = node[0]
+        if kind in (CAT, ALT):
+            children = results[-len(node[1]):]
+            del results[-len(node[1]):]
+            results.append(_splice(kind, children, memo))
+        elif kind == STAR:
+            results.append(_rewrite((STAR, _finish(results.pop(), memo)), memo))
+        else:
+            results.append(node)
+    return _finish(results.pop(), memo)
+
+
+class _Memo:
+    """Structural key and size of every node seen, each computed once.
+
+    Equal subtrees get equal keys, so comparing or hashing a node never
+    walks it.
+    """
+
+    def __init__(self):
+        # id(node) -> (node, key, size); the node keeps its id valid
+        self.nodes = {}
+        self.keys = {}
+
+    def _info(self, node):
+        info = self.nodes.get(id(node))
+        if info is not None:
+            return info
+        stack = [(node, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if id(current) in self.nodes:
+                continue
+            children = _children(current)
+            if not expanded:
+                stack.append((current, True))
+                stack.extend((child, False) for child in children if id(child) not in self.nodes)
+                continue
+            infos = [self.nodes[id(child)] for child in children]
+            signature = (current[0],) + tuple(info[1] for info in infos) if children else current
+            key = self.keys.setdefault(signature, len(self.keys))
+            self.nodes[id(current)] = (current, key, 1 + sum(info[2] for info in infos))
+        return self.nodes[id(node)]
+
+    def key(self, node):
+        return self._info(node)[1]
+
+    def size(self, node):
+        return self._info(node)[2]
+
+
+class _Pending:
+    """Items of a concatenation or alternation whose parent may still
+    flatten it; finished once, when something else needs the node."""
+
+    __slots__ = ('kind', 'items')
+
+    def __init__(self, kind, items):
+        self.kind = kind
+        self.items = items
+
+
+def _splice(kind, children, memo):
+    # join the children's items, reusing the longest pending list so a
+    # chain of nested groups is flattened without copying it at every level
+    parts = []
+    for child in children:
+        if isinstance(child, _Pending) and child.kind == kind:
+            parts.append(child.items)
+            continue
+        child = _finish(child, memo)
+        if child[0] == kind:
+            parts.append(child[1])
+        elif not (kind == CAT and child == EMPTY):
+            parts.append((child,))
+    if not parts:
+        return EMPTY
+    longest = max(range(len(parts)), key=lambda i: len(parts[i]) if isinstance(parts[i], deque) else -1)
+    items = parts[longest] if isinstance(parts[longest], deque) else deque(parts[longest])
+    for part in reversed(parts[:longest]):
+        items.extendleft(reversed(part))
+    for part in parts[longest + 1:]:
+        items.extend(part)
+    return _Pending(kind, items)
+
+
+def _finish(node, memo):
+    if not isinstance(node, _Pending):
+        return node
+    return _rewrite((node.kind, tuple(node.items)), memo)
+
+
+def _rewrite(node, memo, depth=0):
+    """Simplify the root of ``node``, whose children are already simplified."""
+    kind = node[0]
+    if kind == STAR:
+        child = node[1]
+        if child[0] == STAR:
+            return child
+        if child[0] == ALT and EMPTY in child[1]:
+            # (x|ε)* = x*
+            child = _alternation(tuple(item for item in child[1] if item != EMPTY))
+            if child[0] == STAR:
+                return child
+        if child == EMPTY:
+            return EMPTY
+        return (STAR, child)
+    if kind == CAT:
+        items = []
+        for child in node[1]:
+            if child[0] == CAT:
+                items.extend(child[1])
+            elif child != EMPTY:
+                items.append(child)
+        # x*x* = x*
+        key = memo.key
+        items = [item for i, item in enumerate(items)
+                 if not (item[0] == STAR and i and items[i - 1][0] == STAR
+                         and key(items[i - 1]) == key(item))]
+        return _sequence(items)
+    if kind == ALT:
+        items = []
+        seen = set()
+        for child in node[1]:
+            for item in child[1] if child[0] == ALT else (child,):
+                item_key = memo.key(item)
+                if item_key not in seen:
+                    seen.add(item_key)
+                    items.append(item)
+        if EMPTY in items and any(item[0] == STAR for item in items):
+            # a star already matches the empty word
+            items.remove(EMPTY)
+        return _factor(items, memo, depth)
+    return node
+
+
+def _as_sequence(node):
+    return list(node[1]) if node[0] == CAT else [node]
+
+
+# alternations factored inside one another before factoring stops; it only
+# makes trees smaller, so deeper ones are left as they are
+FACTOR_DEPTH = 50
+
+
+def _common(sequences, position, key):
+    # number of elements all sequences share at their start (position 0)
+    # or end (position -1)
+    shortest = min(map(len, sequences))
+    count = 0
+    while count < shortest:
+        index = count if position == 0 else -1 - count
+        first = key(sequences[0][index])
+        if any(key(sequence[index]) != first for sequence in sequences[1:]):
+            break
+        count += 1
+    return count
+
+
+def _factor(items, memo, depth=0):
+    """Factor common leading, then trailing, runs of elements out of
+    alternatives, keeping each rewrite only when it makes the tree smaller."""
+    if depth >= FACTOR_DEPTH:
+        return _alternation(tuple(items))
+    key = memo.key
+    for position in (0, -1):
+        groups = {}
+        for item in items:
+            group_key = key(_as_sequence(item)[position]) if item != EMPTY else None
+            groups.setdefault(group_key, []).append(item)
+        if all(len(group) == 1 for group in groups.values()):
+            continue
+        factored = []
+        for group_key, group in groups.items():
+            if group_key is None or len(group) == 1:
+                factored.extend(group)
+                continue
+            sequences = [_as_sequence(item) for item in group]
+            count = _common(sequences, position, key)
+            if position == 0:
+                common = sequences[0][:count]
+                rest = [_sequence(sequence[count:]) for sequence in sequences]
+            else:
+                common = sequences[0][len(sequences[0]) - count:]
+                rest = [_sequence(sequence[:len(sequence) - count]) for sequence in sequences]
+            inner = _rewrite((ALT, tuple(rest)), memo, depth + 1)
+            parts = (_sequence(common), inner) if position == 0 else (inner, _sequence(common))
+            merged = _rewrite((CAT, parts), memo)
+            if memo.size(merged) < sum(map(memo.size, group)):
+                factored.append(merged)
+            else:
+                factored.extend(group)
+        items = factored
+    return _alternation(tuple(items))
+
+
+def size(node):
+    """Number of nodes in the tree."""
+    total = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        total += 1
+        if node[0] in (CAT, ALT):
+            stack.extend(node[1])
+        elif node[0] == STAR:
+            stack.append(node[1])
+    return total
+
+
+def _children(node):
+    if node[0] in (CAT, ALT):
+        return node[1]
+    if node[0] == STAR:
+        return (node[1],)
+    return ()
+
+
+def _postorder(node):
+    stack = [(node, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+            continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(_children(node)))
+
+
+def to_postfix(node):
+    """Write the tree in the postfix notation of infix_a_postfix.
+
+    An alternation with the empty word among its alternatives becomes the
+    unary '?' of the other ones, and empty words inside concatenations are
+    dropped; only a tree matching nothing but the empty word cannot be
+    written and raises RegexError.
+    """
+    output = []
+    # per node: whether it wrote an operand, False for the empty word
+    written = []
+    for node in _postorder(node):
+        kind = node[0]
+        if kind == LIT:
+            if node[1] in OPERATORS:
+                raise RegexError(f"Literal {node[1]!r} cannot be written in postfix")
+            output.append(node[1])
+            written.append(True)
+        elif kind == CLS:
+            if sum(last - first + 1 for first, last in node[1]) > POSTFIX_CLASS_LIMIT:
+                raise RegexError("Class too large to be written in postfix")
+            chars = [chr(code) for first, last in node[1] for code in range(first, last + 1)]
+            if OPERATORS.intersection(chars):
+                raise RegexError("Class with operator characters cannot be written in postfix")
+            output.append(''.join(chars) + '|' * (len(chars) - 1))
+            written.append(True)
+        elif kind == EPS:
+            written.append(False)
+        elif kind == STAR:
+            if written[-1]:
+                output.append('*')
+        else:
+            children = written[-len(node[1]):]
+            del written[-len(node[1]):]
+            operands = sum(children)
+            output.append(('.' if kind == CAT else '|') * max(operands - 1, 0))
+            if kind == ALT and operands and operands < len(children):
+                output.append('?')
+            written.append(operands > 0)
+    if not written.pop():
+        raise RegexError("The empty word cannot be written in postfix")
+    return ''.join(output)
+
+
+def reverse(node):
+    """Tree matching the reversed words of ``node``."""
+    results = []
+    for node in _postorder(node):
+        kind = node[0]
+        if kind in (CAT, ALT):
+            items = tuple(results[-len(node[1]):])
+            del results[-len(node[1]):]
+            results.append((kind, items[::-1] if kind == CAT else items))
+        elif kind == STAR:
+            results.append((STAR, results.pop()))
+        else:
+            results.append(node)
+    return results.pop()
+
+
+def unanchored(node):
+    """Tree for ``.*node``: matches every word ending in a match of ``node``."""
+    return _sequence([(STAR, ANY)] + _as_sequence(node))
+
+
+def literals(node):
+    """Return ``(prefix, suffix, required)`` for the tree.
+
+    Every word the tree matches starts with ``prefix``, ends with ``suffix``
+    and contains each string in ``required``, longest first (at most
+    REQUIRED_LITERALS of them). Any of them may be empty.
+    """
+    # per node: (exact word or None, prefix, suffix, required strings)
+    info = []
+    for node in _postorder(node):
+        kind = node[0]
+        if kind == LIT:
+            info.append((node[1], node[1], node[1], {node[1]}))
+        elif kind == EPS:
+            info.append(('', '', '', set()))
+        elif kind == CLS:
+            info.append((None, '', '', set()))
+        elif kind == STAR:
+            info[-1] = (None, '', '', set())
+        else:
+            children = info[-len(node[1]):]
+            del info[-len(node[1]):]
+            info.append(_concat_literals(children) if kind == CAT else _alt_literals(children))
+    _, prefix, suffix, required = info.pop()
+    return prefix, suffix, tuple(_best(required))
+
+
+REQUIRED_LITERALS = 3
+
+
+def _best(required):
+    # longest strings first, dropping those inside a longer one
+    best = []
+    for string in sorted(required, key=len, reverse=True):
+        if string and not any(string in kept for kept in best):
+            best.append(string)
+            if len(best) == REQUIRED_LITERALS:
+                break
+    return best
+
+
+def _concat_literals(children):
+    required = set()
+    for child in children:
+        required.update(child[3])
+    # runs of exact children glue the suffix before them to the prefix after
+    current = ''
+    for exact, prefix, suffix, _ in children:
+        if exact is not None:
+            current += exact
+        else:
+            required.add(current + prefix)
+            current = suffix
+    required.add(current)
+
+    exact = None
+    if all(child[0] is not None for child in children):
+        exact = ''.join(child[0] for child in children)
+    prefix = ''
+    for child in children:
+        if child[0] is None:
+            prefix += child[1]
+            break
+        prefix += child[0]
+    suffix = ''
+    for child in reversed(children):
+        if child[0] is None:
+            suffix = child[2] + suffix
+            break
+        suffix = child[0] + suffix
+    return exact, prefix, suffix, set(_best(required))
+
+
+def _alt_literals(children):
+    exact = children[0][0]
+    if any(child[0] != exact for child in children):
+        exact = None
+    prefix = os.path.commonprefix([child[1] for child in children])
+    suffix = os.path.commonprefix([child[2][::-1] for child in children])[::-1]
+    required = set.intersection(*(child[3] for child in children))
+    required.update((prefix, suffix))
+    return exact, prefix, suffix, set(_best(required))
+
+
+@profiling.stage('to_nfa', nfa_counts('ast_nfa'))
+def to_nfa(node):
+    """Thompson construction from the tree into an nfa.ArrayNFA.
+
+    A class becomes a single edge labelled with its ranges tuple.
+    """
+    nfa = ArrayNFA()
+    nfa.start, nfa.accept = _thompson(nfa, node)
+    return nfa
+
+
+@profiling.stage('to_union_nfa', nfa_counts('union_nfa'))
+def to_union_nfa(nodes):
+    """Join the Thompson fragments of ``nodes`` like an alternation.
+
+    Returns the nfa.ArrayNFA and a dict from the accept state of each
+    fragment to the index of its tree in ``nodes``.
+    """
+    nfa = ArrayNFA()
+    nfa.start = nfa.add_state()
+    nfa.accept = nfa.add_state()
+    tags = {}
+    for i, node in enumerate(nodes):
+        start, accept = _thompson(nfa, node)
+        nfa.add_epsilon(nfa.start, start)
+        nfa.add_epsilon(accept, nfa.accept)
+        tags[accept] = i
+    return nfa, tags
+
+
+def _thompson(nfa, node):
+    # adds the fragment for node to nfa and returns its (start, accept)
+    fragments = []
+    for node in _postorder(node):
+        kind = node[0]
+        if kind in (LIT, CLS):
+            fragments.append(nfa.symbol(node[1]))
+        elif kind == EPS:
+            fragments.append(nfa.empty())
+        elif kind == STAR:
+            fragments.append(nfa.star(fragments.pop()))
+        else:
+            parts = fragments[-len(node[1]):]
+            del fragments[-len(node[1]):]
+            fragments.append(nfa.concat(parts) if kind == CAT else nfa.union(parts))
+    return fragments.pop()
@@ -0,0 +1,128 @@
+from array import array
+
+from dfa_table import DEAD, minimize
+from nfa_table import determinize
+from regex_ast import reverse, to_nfa, unanchored
+from stream import StreamMatcher
+
+
+def _table_dfa(tree):
+    return minimize(determinize(to_nfa(tree).compile())[0])
+
+
+class Searcher:
+    """Finds leftmost-longest matches of a syntax tree inside a text.
+
+    One backward pass of the DFA for ``.*`` followed by the reversed
+    expression marks every offset where a match starts. A second backward
+    pass records, for every offset, which forward DFA states can still
+    reach an accepting state on the rest of the text. Each match then runs
+    the anchored forward DFA from its start only until its state leaves
+    that set, one step past the end of the match, so a whole ``finditer``
+    is linear in the text. Both DFAs are table DFAs read through
+    StreamMatcher, so input symbols are mapped to columns with
+    ``str.translate`` once per text.
+    """
+
+    def __init__(self, tree):
+        self.forward = StreamMatcher(_table_dfa(tree))
+        self.reverse = StreamMatcher(_table_dfa(unanchored(reverse(tree))))
+
+    def starts(self, text):
+        """Return a bytearray with a 1 at every offset of ``text``, including
+        ``len(text)``, where a match starts."""
+        matcher = self.reverse
+        table = matcher.table
+        width = matcher.width
+        accept = matcher.dfa.accept
+        codes = matcher._codes(text)
+        state = matcher.dfa.start
+        flags = bytearray(len(text) + 1)
+        flags[len(text)] = accept[state]
+        for i in range(len(text) - 1, -1, -1):
+            state = table[state * width + codes[i]]
+            if state == DEAD:
+                break
+            flags[i] = accept[state]
+        return flags
+
+    def live(self, codes):
+        """Return the live set ids of every offset of ``codes``, including
+        ``len(codes)``, and the sets as bitmasks of forward DFA states.
+
+        The live set of offset ``i`` holds the states from which some
+        ``codes[i:e]`` leads to an accepting state. It only depends on the
+        live set of ``i + 1`` and on ``codes[i]``, so the sets are numbered
+        as they appear and each (set, column) pair is worked out once.
+        """
+        matcher = self.forward
+        table = matcher.table
+        width = matcher.width
+        states = range(1, matcher.dfa.num_states)
+        accepting = 0
+        for state in states:
+            if matcher.dfa.accept[state]:
+                accepting |= 1 << state
+        sets = [accepting]
+        index = {accepting: 0}
+        steps = {}
+        live = array('i', [0]) * (len(codes) + 1)
+        current = 0
+        for i in range(len(codes) - 1, -1, -1):
+            key = current * width + codes[i]
+            previous = steps.get(key)
+            if previous is None:
+                targets = sets[current]
+                mask = accepting
+                for state in states:
+                    if targets >> table[state * width + codes[i]] & 1:
+                        mask |= 1 << state
+                previous = index.get(mask)
+                if previous is None:
+                    previous = index[mask] = len(sets)
+                    sets.append(mask)
+                steps[key] = previous
+            live[i] = current = previous
+        return live, sets
+
+    def _end(self, codes, start, live, sets):
+        matcher = self.forward
+        table = matcher.table
+        width = matcher.width
+        accept = matcher.dfa.accept
+        state = matcher.dfa.start
+        end = start if accept[state] else -1
+        for i in range(start, len(codes)):
+            # no accepting state is reachable any more; DEAD is never live
+            if not sets[live[i]] >> state & 1:
+                break
+            state = table[state * width + codes[i]]
+            if accept[state]:
+                end = i + 1
+        return end
+
+    def finditer(self, string, pos=0, endpos=None):
+        """Yield the ``(start, end)`` spans of the non-overlapping matches in
+        ``string[pos:endpos]``, leftmost-longest, as offsets into ``string``.
+
+        Like ``re.finditer``, an empty match is allowed right after a
+        non-empty one but not at the start of another empty match.
+        """
+        text = string[pos:endpos]
+        flags = self.starts(text)
+        if flags.find(1) < 0:
+            return
+        codes = self.forward._codes(text)
+        live, sets = self.live(codes)
+        offset = 0
+        while True:
+            start = flags.find(1, offset)
+            if start < 0:
+                return
+            end = self._end(codes, start, live, sets)
+            yield pos + start, pos + end
+            offset = end if end > start else start + 1
+
+    def search(self, string, pos=0, endpos=None):
+        """Return the span of the leftmost-longest match, or None."""
+        return next(self.finditer(string, pos, endpos), None)
@@ -0,0 +1,132 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from dfa_table import TableDFA
+
+MAGIC = b'DLPA'
+BUNDLE_MAGIC = b'DLPB'
+VERSION = 2
+# versions loads() can still read; version 1 has no class ranges
+VERSIONS = (1, 2)
+
+# magic, version, flags, states, width, start, symbols bytes
+HEADER = struct.Struct('<4sHHIIII')
+# magic, version, count
+BUNDLE_HEADER = struct.Struct('<4sHxxI')
+# record offset and length, name length
+BUNDLE_ENTRY = struct.Struct('<QQI')
+
+
+def _pad(size, alignment=8):
+    return -size % alignment
+
+
+def dumps(dfa):
+    """Encode a TableDFA as bytes.
+
+    Layout: header, JSON alphabet and class ranges, padding to 4 bytes, the
+    transition table as little-endian int32 and one accept byte per state.
+    """
+    if not isinstance(dfa, TableDFA):
+        dfa = dfa.compile()
+    symbols = {'alphabet': dfa.alphabet, 'ranges': dfa.ranges}
+    alphabet = json.dumps(symbols, ensure_ascii=False).encode('utf-8')
+    table = array('i', dfa.table)
+    if sys.byteorder != 'little':
+        table.byteswap()
+    return b''.join([
+        HEADER.pack(MAGIC, VERSION, 0, dfa.num_states, dfa.width, dfa.start, len(alphabet)),
+        alphabet,
+        bytes(_pad(HEADER.size + len(alphabet), 4)),
+        table.tobytes(),
+        bytes(dfa.accept),
+    ])
+
+
+def loads(buffer):
+    """Decode a TableDFA from a bytes-like object.
+
+    The table and accept map are memoryviews over ``buffer``; nothing is
+    copied on little-endian machines.
+    """
+    view = memoryview(buffer)
+    magic, version, _, states, width, start, alphabet_size = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Not a compiled automaton")
+    if version not in VERSIONS:
+        raise ValueError(f"Unsupported format version {version}")
+    offset = HEADER.size
+    symbols = json.loads(bytes(view[offset:offset + alphabet_size]).decode('utf-8'))
+    if version == 1:
+        alphabet, ranges = symbols, ()
+    else:
+        alphabet, ranges = symbols['alphabet'], [tuple(entry) for entry in symbols['ranges']]
+    offset += alphabet_size + _pad(offset + alphabet_size, 4)
+    table_size = states * width * 4
+    table = view[offset:offset + table_size].cast('i')
+    if sys.byteorder != 'little':
+        table = array('i', table)
+        table.byteswap()
+    offset += table_size
+    accept = view[offset:offset + states]
+    return TableDFA(alphabet, table, accept, start, ranges)
+
+
+def dump(dfa, file):
+    file.write(dumps(dfa))
+
+
+def load(path):
+    """Map ``path`` and decode the automaton in it without reading it into memory."""
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(data)
+
+
+def dump_many(dfas, file):
+    """Write a bundle of named automata; ``dfas`` maps names to DFAs.
+
+    Layout: bundle header, one index entry per automaton, the names, then
+    every record from dumps() aligned to 8 bytes.
+    """
+    names = [name.encode('utf-8') for name in dfas]
+    records = [dumps(dfa) for dfa in dfas.values()]
+    head = BUNDLE_HEADER.size + BUNDLE_ENTRY.size * len(records) + sum(map(len, names))
+    offset = head + _pad(head)
+
+    file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, VERSION, len(records)))
+    for name, record in zip(names, records):
+        file.write(BUNDLE_ENTRY.pack(offset, len(record), len(name)))
+        offset += len(record) + _pad(len(record))
+    file.write(b''.join(names))
+    file.write(bytes(_pad(head)))
+    for record in records:
+        file.write(record)
+        file.write(bytes(_pad(len(record))))
+
+
+def loads_many(buffer):
+    view = memoryview(buffer)
+    magic, version, count = BUNDLE_HEADER.unpack_from(view)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError("Not a bundle of compiled automata")
+    if version not in VERSIONS:
+        raise ValueError(f"Unsupported format version {version}")
+    entries = [BUNDLE_ENTRY.unpack_from(view, BUNDLE_HEADER.size + BUNDLE_ENTRY.size * i)
+               for i in range(count)]
+    offset = BUNDLE_HEADER.size + BUNDLE_ENTRY.size * count
+    dfas = {}
+    for start, size, name_size in entries:
+        name = bytes(view[offset:offset + name_size]).decode('utf-8')
+        offset += name_size
+        dfas[name] = loads(view[start:start + size])
+    return dfas
+
+
+def load_many(path):
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads_many(data)
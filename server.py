@@ -0,0 +1,276 @@
+"""Matching service speaking line-delimited JSON over TCP or a Unix socket.
+
+    python server.py --port 8765
+    python server.py --unix /tmp/dlp.sock
+
+Every request is one JSON object per line and gets one JSON line back:
+
+    {"id": 1, "op": "fullmatch", "pattern": "(a|b)*c", "string": "abc"}
+    {"id": 1, "result": true}
+
+``op`` is ``fullmatch``, ``match`` (length of the longest matching prefix
+or null), ``compile`` (only warms the cache) or ``stats``. Errors come back
+as ``{"id": ..., "error": "..."}``; responses on one connection may arrive
+out of order, so clients match them up by ``id``. A request line longer
+than ``line_limit`` bytes is skipped and answered with an error whose id
+is null.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import serialize
+from dfa_table import match_many, minimize
+from nfa_table import determinize
+from regex_ast import parse, simplify, to_nfa
+
+OPS = ('fullmatch', 'match', 'compile', 'stats')
+# longest request line read, in bytes
+LINE_LIMIT = 64 * 1024 * 1024
+
+
+def compile_expression(expression):
+    """Build the minimal TableDFA for ``expression`` and return it serialized,
+    so it can cross the process pool cheaply."""
+    tree = simplify(parse(expression))
+    return serialize.dumps(minimize(determinize(to_nfa(tree).compile())[0]))
+
+
+class MatchServer:
+    """Asyncio server sharing one compiled-pattern cache between clients.
+
+    Compiles run in a process pool (a thread pool with ``workers=0``) and
+    concurrent compiles of the same expression share one job. Fullmatch
+    requests for the same pattern that arrive within ``batch_delay``
+    seconds of each other are answered by one match_many call, up to
+    ``max_batch`` strings at a time, run in a thread so the event loop keeps
+    serving other connections meanwhile.
+    """
+
+    def __init__(self, workers=None, cache_size=512, batch_delay=0.001, max_batch=1024,
+                 line_limit=LINE_LIMIT):
+        self.pool = ProcessPoolExecutor(workers) if workers != 0 else None
+        self.cache_size = cache_size
+        self.line_limit = line_limit
+        self.batch_delay = batch_delay
+        self.max_batch = max_batch
+        self.cache = OrderedDict()
+        self.batches = {}
+        # match_many calls still running
+        self.batch_tasks = set()
+        self.server = None
+        # handler task -> its writer
+        self.connections = {}
+        self.stats = {'requests': 0, 'compiles': 0, 'cache_hits': 0, 'batches': 0, 'batched': 0}
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=self.line_limit)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=self.line_limit)
+        return self.server
+
+    @property
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # open connections keep their handlers waiting for input
+            handlers = list(self.connections)
+            for writer in self.connections.values():
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await asyncio.gather(*self.batch_tasks, return_exceptions=True)
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def compile(self, expression):
+        """Return the TableDFA for ``expression``, compiling it at most once."""
+        job = self.cache.get(expression)
+        if job is not None:
+            self.stats['cache_hits'] += 1
+            self.cache.move_to_end(expression)
+        else:
+            self.stats['compiles'] += 1
+            job = self.cache[expression] = asyncio.ensure_future(self._build(expression))
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        try:
+            return await asyncio.shield(job)
+        except Exception:
+            # failed compiles are not cached
+            if self.cache.get(expression) is job:
+                del self.cache[expression]
+            raise
+
+    async def _build(self, expression):
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.pool, compile_expression, expression)
+        return serialize.loads(data)
+
+    async def fullmatch(self, expression, string):
+        dfa = await self.compile(expression)
+        loop = asyncio.get_running_loop()
+        batch = self.batches.get(expression)
+        if batch is None:
+            batch = self.batches[expression] = (dfa, [], [])
+            loop.call_later(self.batch_delay, self._flush, expression, batch)
+        future = loop.create_future()
+        batch[1].append(string)
+        batch[2].append(future)
+        if len(batch[1]) >= self.max_batch:
+            self._flush(expression, batch)
+        return await future
+
+    def _flush(self, expression, batch):
+        if self.batches.get(expression) is not batch:
+            return
+        del self.batches[expression]
+        dfa, strings, futures = batch
+        self.stats['batches'] += 1
+        self.stats['batched'] += len(strings)
+        task = asyncio.ensure_future(self._match_batch(dfa, strings, futures))
+        self.batch_tasks.add(task)
+        task.add_done_callback(self.batch_tasks.discard)
+
+    async def _match_batch(self, dfa, strings, futures):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(None, match_many, dfa, strings)
+        except Exception as error:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(bool(result))
+
+    async def respond(self, request):
+        op = request.get('op')
+        if op not in OPS:
+            raise ValueError(f"Unknown op: {op!r}")
+        if op == 'stats':
+            return dict(self.stats, cache_size=len(self.cache))
+        expression = request['pattern']
+        if not isinstance(expression, str):
+            raise ValueError("'pattern' must be a string")
+        if op == 'compile':
+            dfa = await self.compile(expression)
+            return {'states': dfa.num_states - 1, 'transitions': dfa.num_transitions}
+        string = request['string']
+        if not isinstance(string, str):
+            raise ValueError("'string' must be a string")
+        if op == 'fullmatch':
+            return await self.fullmatch(expression, string)
+        end = (await self.compile(expression)).longest_prefix(string)
+        return None if end < 0 else end
+
+    async def _answer(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get('id')
+            response = {'id': request_id, 'result': await self.respond(request)}
+        except KeyError as error:
+            response = {'id': request_id, 'error': f"Missing field {error}"}
+        except Exception as error:
+            response = {'id': request_id, 'error': str(error)}
+        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+
+    async def _skip_line(self, reader):
+        # drop the rest of an over-long line, keeping what follows it
+        while True:
+            try:
+                await reader.readuntil(b'\n')
+                return
+            except asyncio.LimitOverrunError as error:
+                await reader.read(error.consumed)
+            except asyncio.IncompleteReadError:
+                return
+
+    async def handle(self, reader, writer):
+        tasks = set()
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as error:
+                    # the last line may end without a newline
+                    line = error.partial
+                except asyncio.LimitOverrunError:
+                    self.stats['requests'] += 1
+                    message = f"Request line longer than {self.line_limit} bytes"
+                    writer.write(json.dumps({'id': None, 'error': message}).encode('utf-8') + b'\n')
+                    await self._skip_line(reader)
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                self.stats['requests'] += 1
+                task = asyncio.ensure_future(self._answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await writer.drain()
+            if tasks:
+                await asyncio.gather(*tasks)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=0, path=None, **options):
+    """Run a MatchServer until cancelled."""
+    async with MatchServer(**options) as server:
+        await server.start(host, port, path)
+        print(f"Listening on {path or server.address}", flush=True)
+        await server.server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='compile processes (0 compiles in a thread)')
+    parser.add_argument('--cache-size', type=int, default=512)
+    parser.add_argument('--batch-delay', type=float, default=0.001,
+                        help='seconds to wait for more fullmatch requests of a pattern')
+    parser.add_argument('--max-batch', type=int, default=1024)
+    parser.add_argument('--line-limit', type=int, default=LINE_LIMIT,
+                        help='longest request line in bytes')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, workers=args.workers,
+                          cache_size=args.cache_size, batch_delay=args.batch_delay,
+                          max_batch=args.max_batch, line_limit=args.line_limit))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
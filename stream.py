@@ -0,0 +1,119 @@
+import mmap
+from array import array
+
+from dfa_table import DEAD, TableDFA, _ColumnMap
+
+CHUNK_SIZE = 1 << 20
+
+
+def chunks(source, chunk_size=CHUNK_SIZE):
+    """Yield ``source`` in pieces: str, bytes-like and mmap objects are sliced,
+    file objects are read and anything else is iterated as given."""
+    if isinstance(source, (str, bytes, bytearray, memoryview, mmap.mmap)):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from source
+
+
+class StreamMatcher:
+    """Runs a TableDFA over input fed in chunks.
+
+    The DFA state is kept between ``feed`` calls, so a scan can be stopped
+    and resumed. Chunks may be str or bytes; bytes are mapped to columns with
+    ``bytes.translate`` and never decoded, which limits them to symbols below
+    U+0100. With ``lines=True`` every line is matched on its own and ``feed``
+    returns the numbers of the lines it completed that match.
+    """
+
+    def __init__(self, dfa, lines=False):
+        if not isinstance(dfa, TableDFA):
+            dfa = dfa.compile()
+        self.dfa = dfa
+        self.lines = lines
+        # one extra column per row for symbols outside the alphabet
+        self.width = dfa.width + 1
+        self.table = array('i')
+        for state in range(dfa.num_states):
+            self.table.extend(dfa.table[state * dfa.width:(state + 1) * dfa.width])
+            self.table.append(DEAD)
+        self.column_map = _ColumnMap(dfa)
+        self.byte_map = None
+        if dfa.width < 256:
+            columns = [dfa.symbol_ids[chr(code)] for code in range(256)]
+            self.byte_map = bytes(dfa.width if column is None else column for column in columns)
+        self.reset()
+
+    def reset(self):
+        self.state = self.dfa.start
+        self.line = 1
+        self.pending = False
+
+    def _codes(self, chunk):
+        if isinstance(chunk, str):
+            return memoryview(chunk.translate(self.column_map).encode('utf-32-le')).cast('I')
+        if self.byte_map is None:
+            raise ValueError("Alphabet too wide for byte input")
+        return bytes(chunk).translate(self.byte_map)
+
+    def _advance(self, state, chunk):
+        if state == DEAD:
+            return state
+        table = self.table
+        width = self.width
+        for code in self._codes(chunk):
+            state = table[state * width + code]
+            if state == DEAD:
+                break
+        return state
+
+    def feed(self, chunk):
+        if not self.lines:
+            self.state = self._advance(self.state, chunk)
+            return None
+
+        parts = chunk.split('\n' if isinstance(chunk, str) else b'\n')
+        matches = []
+        accept = self.dfa.accept
+        state = self.state
+        for part in parts[:-1]:
+            if accept[self._advance(state, part)]:
+                matches.append(self.line)
+            self.line += 1
+            state = self.dfa.start
+        self.state = self._advance(state, parts[-1])
+        self.pending = self.pending and len(parts) == 1 or bool(parts[-1])
+        return matches
+
+    def finish(self):
+        """Close the last line in line mode; returns its number if it matches."""
+        matches = []
+        if self.lines and self.pending and self.accepts():
+            matches.append(self.line)
+        return matches
+
+    def accepts(self):
+        return bool(self.dfa.accept[self.state])
+
+
+def stream_accepts(dfa, source, chunk_size=CHUNK_SIZE):
+    matcher = StreamMatcher(dfa)
+    for chunk in chunks(source, chunk_size):
+        matcher.feed(chunk)
+        if matcher.state == DEAD:
+            return False
+    return matcher.accepts()
+
+
+def grep(dfa, source, chunk_size=CHUNK_SIZE):
+    """Yield the numbers (from 1) of the lines of ``source`` that match ``dfa``."""
+    matcher = StreamMatcher(dfa, lines=True)
+    for chunk in chunks(source, chunk_size):
+        yield from matcher.feed(chunk)
+    yield from matcher.finish()
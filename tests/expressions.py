@@ -0,0 +1,34 @@
+import itertools
+import random
+
+ALPHABET = 'abcd'
+# every string over ALPHABET up to length 4
+WORDS = [''.join(word) for n in range(5) for word in itertools.product(ALPHABET, repeat=n)]
+
+
+def random_expression(rng, depth=0):
+    """Return a random expression in this repo's syntax and the same
+    expression for ``re``; ours writes concatenation with '.' at times."""
+    r = rng.random()
+    if depth > 3 or r < 0.3:
+        atom = rng.choice(['a', 'b', 'c', '[ab]', '[^a]', '[b-d]'])
+        return atom, atom
+    if r < 0.5:
+        left, left_re = random_expression(rng, depth + 1)
+        right, right_re = random_expression(rng, depth + 1)
+        dot = '.' if rng.random() < 0.3 else ''
+        return f'({left}){dot}({right})', f'({left_re})({right_re})'
+    if r < 0.7:
+        parts = [random_expression(rng, depth + 1) for _ in range(rng.randint(2, 3))]
+        if rng.random() < 0.2:
+            parts.append(('', ''))
+        return ('(' + '|'.join(part for part, _ in parts) + ')',
+                '(' + '|'.join(part for _, part in parts) + ')')
+    inner, inner_re = random_expression(rng, depth + 1)
+    operator = rng.choice('*+?')
+    return f'({inner}){operator}', f'({inner_re}){operator}'
+
+
+def random_expressions(seed, count):
+    rng = random.Random(seed)
+    return [random_expression(rng) for _ in range(count)]
@@ -0,0 +1,44 @@
+import os
+
+import codegen
+from dfa_table import minimize
+from nfa_table import determinize
+from regex_ast import parse, simplify, to_nfa
+
+
+def _dfa(expression):
+    return minimize(determinize(to_nfa(simplify(parse(expression))).compile())[0])
+
+
+def test_cache_is_reused(tmp_path):
+    dfa = _dfa('(ab|c)*d')
+    cache = str(tmp_path / 'matcher.py')
+    first = codegen.compile_dfa(dfa, cache)
+    with open(cache, encoding='utf-8') as f:
+        written = f.read()
+    second = codegen.compile_dfa(dfa, cache)
+    assert second.source == first.source == written
+    assert second.accepts('abcd') and not second.accepts('acd')
+    assert os.listdir(tmp_path) == ['matcher.py']
+
+
+def test_truncated_cache_is_regenerated(tmp_path):
+    dfa = _dfa('(ab|c)*d')
+    cache = str(tmp_path / 'matcher.py')
+    source = codegen.compile_dfa(dfa, cache).source
+    with open(cache, 'w', encoding='utf-8') as f:
+        f.write(source[:len(source) // 2])
+    matcher = codegen.compile_dfa(dfa, cache)
+    assert matcher.source == source
+    assert matcher.accepts('cabd')
+
+
+def test_cache_that_does_not_compile_is_regenerated(tmp_path):
+    dfa = _dfa('a+b')
+    cache = str(tmp_path / 'matcher.py')
+    body = 'def accepts(string:\n'
+    with open(cache, 'w', encoding='utf-8') as f:
+        f.write(codegen._header(dfa, body) + '\n' + body)
+    matcher = codegen.compile_dfa(dfa, cache)
+    assert matcher.accepts('aab') and not matcher.accepts('b')
+    assert codegen.compile_dfa(dfa, cache).source == matcher.source
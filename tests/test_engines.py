@@ -0,0 +1,53 @@
+import re
+
+from codegen import GeneratedDFA
+from dfa_table import match_many, minimize
+from lazy_dfa import LazyDFA
+from nfa_table import determinize
+from pattern import ENGINES, Pattern
+from regex_ast import parse, simplify, to_nfa
+from stream import stream_accepts
+
+from tests.expressions import WORDS, random_expressions
+
+
+def _longest_prefix(compiled, word):
+    ends = [end for end in range(len(word) + 1) if compiled.fullmatch(word, 0, end)]
+    return max(ends) if ends else None
+
+
+def test_engines_agree_with_re():
+    for expression, python in random_expressions(3, 80):
+        compiled = re.compile(python)
+        patterns = [Pattern(expression, engine) for engine in ENGINES]
+        for word in WORDS:
+            expected = compiled.fullmatch(word) is not None
+            longest = _longest_prefix(compiled, word)
+            for pattern in patterns:
+                assert pattern.fullmatch(word) == expected, (pattern, word)
+                assert pattern.match(word) == longest, (pattern, word)
+
+
+def test_table_runners_agree():
+    for expression, python in random_expressions(4, 60):
+        compiled = re.compile(python)
+        dfa = minimize(determinize(to_nfa(simplify(parse(expression))).compile())[0])
+        generated = GeneratedDFA(dfa)
+        expected = [compiled.fullmatch(word) is not None for word in WORDS]
+        assert [bool(accepted) for accepted in match_many(dfa, WORDS)] == expected, expression
+        assert [generated.accepts(word) for word in WORDS] == expected, expression
+        assert [stream_accepts(dfa, [word[:1], word[1:]]) for word in WORDS] == expected, expression
+
+
+def test_lazy_dfa_agrees_while_flushing():
+    fallbacks = 0
+    for expression, python in random_expressions(5, 40):
+        compiled = re.compile(python)
+        nfa = to_nfa(simplify(parse(expression))).compile()
+        # a tiny cache flushes all the time and soon falls back to the NFA
+        lazy = LazyDFA(nfa, max_states=2, min_progress=3)
+        for word in WORDS:
+            assert lazy.accepts(word) == (compiled.fullmatch(word) is not None), (expression, word)
+            assert len(lazy.transitions) <= 2
+        fallbacks += lazy.fallbacks
+    assert fallbacks
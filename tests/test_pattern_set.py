@@ -0,0 +1,67 @@
+import random
+import re
+
+from incremental import MIN_COMPACT, IncrementalSet
+from pattern import PatternSet
+
+from tests.expressions import WORDS
+
+EXPRESSIONS = ['ab*', 'a(b|c)*', '[a-c]+', 'abc', 'd|ab', '(ab)*', '[^d]*c', 'b[a-d]d?', 'c*']
+
+
+def _expected(live, word):
+    return sorted(i for i, (compiled, _) in live.items() if compiled.fullmatch(word))
+
+
+def _first(live, word):
+    # lowest priority wins, ties go to the lowest id
+    matching = _expected(live, word)
+    return min(matching, key=lambda i: (live[i][1], i)) if matching else None
+
+
+def test_pattern_set_matches_and_priorities():
+    priorities = [3, 1, 4, 1, 5, 9, 2, 6, 5]
+    patterns = PatternSet(EXPRESSIONS, priorities)
+    live = {i: (re.compile(expression), priority)
+            for i, (expression, priority) in enumerate(zip(EXPRESSIONS, priorities))}
+    for word in WORDS:
+        assert patterns.matches(word) == _expected(live, word), word
+        assert patterns.first(word) == _first(live, word), word
+
+
+def test_incremental_set_remove_and_add_again():
+    rng = random.Random(8)
+    incremental = IncrementalSet()
+    live = {}
+    for step in range(150):
+        if live and rng.random() < 0.4:
+            pattern_id = rng.choice(list(live))
+            incremental.remove(pattern_id)
+            del live[pattern_id]
+        else:
+            # expressions come back after being removed, under a new id
+            expression = rng.choice(EXPRESSIONS)
+            pattern_id = incremental.add(expression, priority=rng.randint(0, 3))
+            assert pattern_id not in live
+            live[pattern_id] = (re.compile(expression), incremental.priorities[pattern_id])
+        for word in WORDS[::7]:
+            assert incremental.matches(word) == _expected(live, word), (step, word)
+            assert incremental.first(word) == _first(live, word), (step, word)
+
+    frozen = incremental.freeze()
+    ids = sorted(live)
+    for word in WORDS:
+        assert [ids[i] for i in frozen.matches(word)] == incremental.matches(word), word
+
+
+def test_incremental_set_reclaims_removed_expressions():
+    rng = random.Random(9)
+    incremental = IncrementalSet(EXPRESSIONS * 4)
+    nfa_states, dfa_states = incremental.nfa.num_states, incremental.num_states
+    for _ in range(500):
+        incremental.remove(rng.choice(list(incremental.expressions)))
+        incremental.add(rng.choice(EXPRESSIONS))
+        # removed fragments and unreachable DFA states do not pile up
+        assert incremental.nfa.num_states <= 3 * nfa_states
+        assert incremental.num_states <= 2 * max(dfa_states, MIN_COMPACT)
+    assert len(incremental) == len(EXPRESSIONS) * 4
@@ -0,0 +1,16 @@
+import profiling
+from AFD import postfix_to_nfa
+from regex_ast import parse, to_nfa, to_union_nfa
+
+
+def test_nfa_builders_record_separate_stages():
+    with profiling.collect() as stats:
+        postfix_to_nfa('ab.')
+        to_nfa(parse('abc'))
+        to_union_nfa([parse('a'), parse('bc'), parse('d')])
+    assert {'postfix_to_nfa', 'to_nfa', 'to_union_nfa'} <= set(stats.stages)
+    assert all(stats.stages[name]['calls'] == 1
+               for name in ('postfix_to_nfa', 'to_nfa', 'to_union_nfa'))
+    assert stats.counts['nfa_states'] == 4
+    assert stats.counts['ast_nfa_states'] == 6
+    assert stats.counts['union_nfa_states'] == 2 + 2 + 4 + 2
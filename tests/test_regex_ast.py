@@ -0,0 +1,112 @@
+import re
+import time
+
+import pytest
+
+import AFD
+import Direc
+from nfa import postfix_to_array_nfa
+from nfa_table import determinize
+from regex_ast import RegexError, parse, simplify, to_nfa, to_postfix
+
+from tests.expressions import WORDS, random_expressions
+
+
+def _dfa(tree):
+    return determinize(to_nfa(tree).compile())[0]
+
+
+def test_parse_and_simplify_agree_with_re():
+    for expression, python in random_expressions(1, 300):
+        tree = parse(expression)
+        parsed, simplified = _dfa(tree), _dfa(simplify(tree))
+        compiled = re.compile(python)
+        for word in WORDS:
+            expected = compiled.fullmatch(word) is not None
+            assert parsed.accepts(word) == expected, (expression, word)
+            assert simplified.accepts(word) == expected, (expression, word)
+
+
+@pytest.mark.parametrize('expression', ['a.', '*a', '(a', 'a)', '[b-a]', '[]', 'a\\'])
+def test_parse_errors(expression):
+    with pytest.raises(RegexError):
+        parse(expression)
+
+
+def _postfix_builders(postfix):
+    dfa = AFD.nfa_to_dfa(AFD.postfix_to_nfa(postfix))
+    table = determinize(postfix_to_array_nfa(postfix).compile())[0]
+    direct = Direc.construir_tabla(postfix)
+    return [lambda word: AFD.dfa_accepts_string(dfa, word), table.accepts, direct.accepts]
+
+
+def test_optional_parts_survive_postfix():
+    written = 0
+    for expression, python in random_expressions(2, 300):
+        try:
+            postfix = to_postfix(simplify(parse(expression)))
+        except RegexError as error:
+            # '[^a]' spells out most of Unicode
+            assert 'too large' in str(error) or 'empty word' in str(error), expression
+            continue
+        written += 1
+        compiled = re.compile(python)
+        builders = _postfix_builders(postfix)
+        for word in WORDS:
+            expected = compiled.fullmatch(word) is not None
+            assert all(accepts(word) == expected for accepts in builders), (expression, postfix, word)
+    assert written > 100
+
+
+def test_empty_alternatives_become_question_marks():
+    assert to_postfix(simplify(parse('a(b|)'))) == 'ab?.'
+    assert to_postfix(simplify(parse('(|a)b'))) == 'a?b.'
+    with pytest.raises(RegexError):
+        to_postfix(simplify(parse('(|)')))
+
+
+def _seconds(expression):
+    tree = parse(expression)
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        simplify(tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _nested_alternation(n):
+    expression = 'z|y'
+    for _ in range(n):
+        expression = 'x(' + expression + ')|y'
+    return expression
+
+
+def _assert_linear(make, n):
+    # doubling the input must not come close to quadrupling the time
+    small, large = _seconds(make(n)), _seconds(make(2 * n))
+    assert large < 3 * small + 0.05, (small, large)
+
+
+def test_deep_nesting_does_not_recurse():
+    simplify(parse('(a' * 3000 + ')' * 3000))
+    simplify(parse('(' * 2000 + 'a' + ')*' * 2000))
+    simplify(parse('a' * 3000 + 'b|' + 'a' * 3000 + 'c'))
+
+
+def test_simplify_time_is_linear_in_nesting():
+    _assert_linear(lambda n: '(a' * n + ')' * n, 10000)
+    _assert_linear(_nested_alternation, 2000)
+    _assert_linear(lambda n: '(a|' * n + 'b' + ')' * n, 4000)
+
+
+def test_postfix_and_tree_share_the_thompson_construction():
+    # without classes, which postfix spells out as alternations, both build
+    # the same automaton
+    for expression in ['ab?|c*', '(a|b)*abb', 'a(b|)c', 'x+y']:
+        tree = simplify(parse(expression))
+        from_tree = to_nfa(tree).compile()
+        from_postfix = postfix_to_array_nfa(to_postfix(tree)).compile()
+        assert len(from_tree) == len(from_postfix)
+        assert from_tree.num_transitions == from_postfix.num_transitions
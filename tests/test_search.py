@@ -0,0 +1,62 @@
+import random
+import re
+import time
+
+from pattern import Pattern
+
+from tests.expressions import random_expressions
+
+
+def _reference(compiled, text):
+    # leftmost-longest by brute force; an empty match may follow a
+    # non-empty one but not another empty one
+    spans = []
+    offset = 0
+    while offset <= len(text):
+        for start in range(offset, len(text) + 1):
+            ends = [end for end in range(start, len(text) + 1) if compiled.fullmatch(text, start, end)]
+            if ends:
+                break
+        else:
+            return spans
+        end = max(ends)
+        spans.append((start, end))
+        offset = end if end > start else start + 1
+    return spans
+
+
+def test_finditer_is_leftmost_longest():
+    rng = random.Random(6)
+    expressions = random_expressions(6, 60) + [
+        ('a|a[^b]*b', 'a|a[^b]*b'), ('(ab|a)*', '(ab|a)*'), ('b?', 'b?'), ('ab|abc|c', 'ab|abc|c'),
+    ]
+    for expression, python in expressions:
+        compiled = re.compile(python)
+        pattern = Pattern(expression)
+        for _ in range(40):
+            text = ''.join(rng.choice('abcd') for _ in range(rng.randint(0, 12)))
+            spans = _reference(compiled, text)
+            assert list(pattern.finditer(text)) == spans, (expression, text)
+            assert pattern.search(text) == (spans[0] if spans else None), (expression, text)
+
+
+def test_finditer_between_pos_and_endpos():
+    pattern = Pattern('ab*')
+    assert list(pattern.finditer('abbxabab', 1)) == [(4, 6), (6, 8)]
+    assert list(pattern.finditer('abbxabab', 0, 7)) == [(0, 3), (4, 6), (6, 7)]
+    assert pattern.search('xxab', 3) is None
+
+
+def _seconds(pattern, text):
+    start = time.perf_counter()
+    list(pattern.finditer(text))
+    return time.perf_counter() - start
+
+
+def test_forward_scan_is_bounded():
+    # every 'a' is a match, but 'a[^b]*b' keeps a longer one possible
+    # until the end of the text
+    pattern = Pattern('a|a[^b]*b')
+    assert len(list(pattern.finditer('a' * 1000))) == 1000
+    small, large = _seconds(pattern, 'a' * 20000), _seconds(pattern, 'a' * 40000)
+    assert large < 3 * small + 0.05, (small, large)
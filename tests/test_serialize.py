@@ -0,0 +1,52 @@
+import re
+
+import serialize
+from dfa_table import minimize
+from nfa_table import determinize
+from regex_ast import parse, simplify, to_nfa
+
+from tests.expressions import WORDS, random_expressions
+
+
+def _dfa(expression):
+    return minimize(determinize(to_nfa(simplify(parse(expression))).compile())[0])
+
+
+def _same(loaded, dfa):
+    assert loaded.alphabet == dfa.alphabet
+    assert loaded.ranges == dfa.ranges
+    assert (loaded.start, loaded.width) == (dfa.start, dfa.width)
+    assert list(loaded.table) == list(dfa.table)
+    assert list(loaded.accept) == list(dfa.accept)
+
+
+def test_round_trip():
+    for expression, python in random_expressions(7, 60):
+        dfa = _dfa(expression)
+        loaded = serialize.loads(serialize.dumps(dfa))
+        _same(loaded, dfa)
+        compiled = re.compile(python)
+        for word in WORDS:
+            assert loaded.accepts(word) == (compiled.fullmatch(word) is not None), (expression, word)
+
+
+def test_round_trip_keeps_class_ranges(tmp_path):
+    dfa = _dfa('[a-z一-鿿]+[^x]')
+    path = tmp_path / 'dfa.bin'
+    with open(path, 'wb') as f:
+        serialize.dump(dfa, f)
+    loaded = serialize.load(str(path))
+    _same(loaded, dfa)
+    assert loaded.accepts('q中\U0001f600') and not loaded.accepts('qx')
+
+
+def test_bundle_round_trip(tmp_path):
+    dfas = {'words': _dfa('[a-z]+'), 'numbers': _dfa('[0-9]+(\\.[0-9]+)?'), 'empty': _dfa('a*')}
+    path = tmp_path / 'bundle.bin'
+    with open(path, 'wb') as f:
+        serialize.dump_many(dfas, f)
+    loaded = serialize.load_many(str(path))
+    assert list(loaded) == list(dfas)
+    for name, dfa in dfas.items():
+        _same(loaded[name], dfa)
+    assert loaded['numbers'].accepts('3.14') and not loaded['numbers'].accepts('3.')
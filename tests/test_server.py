@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+from server import MatchServer
+
+
+async def _exchange(server, lines):
+    host, port = server.address[:2]
+    reader, writer = await asyncio.open_connection(host, port)
+    for line in lines:
+        writer.write(line + b'\n')
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in lines]
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+
+def test_long_line_gets_an_error_and_the_connection_survives():
+    async def run():
+        async with MatchServer(workers=0, line_limit=1024) as server:
+            await server.start()
+            request = {'id': 2, 'op': 'fullmatch', 'pattern': '(a|b)*c', 'string': 'abc'}
+            return await _exchange(server, [b'x' * 100000, json.dumps(request).encode()])
+
+    long_line, answer = asyncio.run(run())
+    assert long_line['id'] is None and 'longer than 1024' in long_line['error']
+    assert answer == {'id': 2, 'result': True}
+
+
+def test_batches_run_off_the_event_loop():
+    async def run():
+        async with MatchServer(workers=0) as server:
+            await server.compile('(a|b)*c')
+            match = asyncio.ensure_future(server.fullmatch('(a|b)*c', 'ab' * 20000 + 'c'))
+            ticks = 0
+            while not match.done():
+                await asyncio.sleep(0.001)
+                ticks += 1
+            return ticks, match.result()
+
+    ticks, result = asyncio.run(run())
+    assert result is True
+    # the loop kept running while match_many worked through the batch
+    assert ticks > 10